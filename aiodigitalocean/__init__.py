@@ -17,4 +17,12 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from .exceptions import *
 from .client import Client
-from .abc import Status
+from .abc import Status, Action
+from .ratelimit import RateLimiter
+from .retry import RetryPolicy
+from .metrics import Metrics
+from .table import DropletTable
+from .inventory import DropletInventory
+from .watch import DropletEvent, DropletAdded, DropletRemoved,\
+    DropletChanged
+from .query import In, Range, Prefix, AnyOf, AllOf, AnyTag, AllTags
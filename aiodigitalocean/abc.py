@@ -18,9 +18,15 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 import abc
 import dateutil.parser
 from .exceptions import Forbidden, HTTPException, CannotCreateDroplet,\
-    CannotCreateLoadBalancer
+    CannotCreateLoadBalancer, CannotRunFleetAction
+from .pagination import paginate, fetch_all_pages, fetch_by_ids,\
+    build_address
+from .query import Operator, AllOf, compile_predicate, droplet_api_filters,\
+    DROPLET_FIELDS, LOAD_BALANCER_FIELDS
 import asyncio
-from functools import total_ordering
+import weakref
+from datetime import datetime
+from functools import total_ordering, lru_cache
 # Imports go here.
 
 
@@ -45,6 +51,15 @@ class Status(abc.ABC):
 
     class Other(object):
         __slots__ = ["status"]
+        _interned = {}
+
+        def __new__(cls, status):
+            # Only a handful of unusual statuses exist, so share one of each.
+            other = cls._interned.get(status)
+            if other is None:
+                other = super().__new__(cls)
+                cls._interned[status] = other
+            return other
 
         def __init__(self, status):
             self.status = status
@@ -75,6 +90,58 @@ class NetworkType(abc.ABC):
 # A class with a bunch of network types in.
 
 
+@lru_cache(maxsize=4096)
+def parse_timestamp(value):
+    try:
+        if value.endswith("Z"):
+            return datetime.fromisoformat(value[:-1] + "+00:00")
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return dateutil.parser.parse(value)
+# Parses a API timestamp. The API always sends ISO 8601, which the stdlib
+# parses far faster than dateutil, so dateutil is only the fallback.
+
+
+_UNSET = object()
+# Marks a lazy field which has not been decoded yet.
+
+
+class LazyField:
+    __slots__ = ["slot", "decode"]
+
+    def __init__(self, slot, decode):
+        self.slot = slot
+        self.decode = decode
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+
+        value = getattr(obj, self.slot)
+        if value is _UNSET:
+            value = self.decode(obj._json)
+            setattr(obj, self.slot, value)
+        return value
+
+    def __set__(self, obj, value):
+        setattr(obj, self.slot, value)
+
+    @staticmethod
+    def setup(obj, _json):
+        obj._json = _json
+        for field in obj._lazy_fields:
+            setattr(obj, field.slot, _UNSET)
+
+        if not getattr(obj.client, "lazy_models", False):
+            for field in obj._lazy_fields:
+                field.__get__(obj)
+            # Everything is decoded, so the JSON can go.
+            obj._json = None
+    # Gets a object ready for its lazy fields, decoding them all straight
+    # away unless the client has lazy_models turned on.
+# A attribute decoded from the JSON on first access and then kept in a slot.
+
+
 class Kernel(abc.ABC):
     __slots__ = ["id", "name", "version"]
 
@@ -96,17 +163,29 @@ class Image(abc.ABC):
     __slots__ = [
         "id", "name", "distribution", "slug",
         "public", "regions", "created_at", "type",
-        "min_disk_size", "size_gigabytes"
+        "min_disk_size", "size_gigabytes", "_source", "__weakref__"
     ]
+    _interned = weakref.WeakValueDictionary()
+
+    @classmethod
+    def interned(cls, image_json):
+        image = cls._interned.get(image_json['id'])
+        if image is None or image._source != image_json:
+            image = cls(image_json)
+            cls._interned[image.id] = image
+        return image
+    # Gets the shared image for the ID, building it if it's new or its JSON
+    # changed.
 
     def __init__(self, image_json):
+        self._source = image_json
         self.id = image_json['id']
         self.name = image_json['name']
         self.distribution = image_json['distribution']
         self.slug = image_json['slug']
         self.public = image_json['public']
         self.regions = image_json['regions']
-        self.created_at = dateutil.parser.parse(
+        self.created_at = parse_timestamp(
             image_json['created_at']
         )
 
@@ -170,10 +249,24 @@ class Networks(abc.ABC):
 class Region(abc.ABC):
     __slots__ = [
         "name", "slug", "size_slugs",
-        "features", "available"
+        "features", "available", "_source", "__weakref__"
     ]
+    _interned = weakref.WeakValueDictionary()
+
+    @classmethod
+    def interned(cls, region_json):
+        slug = region_json.get('slug')
+        region = cls._interned.get(slug)
+        if region is None or region._source != region_json:
+            region = cls(region_json)
+            if slug:
+                cls._interned[slug] = region
+        return region
+    # Gets the shared region for the slug, building it if it's new or its
+    # JSON changed.
 
     def __init__(self, region_json):
+        self._source = region_json
         self.name = region_json.get('name')
         self.slug = region_json.get('slug')
         self.size_slugs = region_json.get('sizes')
@@ -191,16 +284,75 @@ class Region(abc.ABC):
 # A region object.
 
 
+class Action(abc.ABC):
+    __slots__ = [
+        "client", "id", "status", "type", "started_at",
+        "completed_at", "resource_id", "resource_type",
+        "region_slug"
+    ]
+
+    def __init__(self, client, action_json):
+        self.client = client
+        self.id = action_json['id']
+        self.status = action_json['status']
+        self.type = action_json['type']
+        self.started_at = parse_timestamp(
+            action_json['started_at']
+        ) if action_json.get('started_at') else None
+        self.completed_at = parse_timestamp(
+            action_json['completed_at']
+        ) if action_json.get('completed_at') else None
+        self.resource_id = action_json.get('resource_id')
+        self.resource_type = action_json.get('resource_type')
+        self.region_slug = action_json.get('region_slug')
+
+    @property
+    def finished(self):
+        return self.status in ("completed", "errored")
+    # Checks if the action has completed or errored.
+
+    async def wait(self, timeout=None):
+        if self.finished:
+            return self
+
+        action = await self.client.action_poller.wait(
+            self.id, timeout
+        )
+        self.status = action.status
+        self.completed_at = action.completed_at
+        return self
+    # Waits for the action to finish, raising WaitTimeout if that takes
+    # longer than the timeout.
+# A action object.
+
+
 class Droplet(abc.ABC):
     __slots__ = [
         "id", "name", "memory", "vcpus",
-        "disk", "locked", "status", "kernel",
-        "created_at", "features", "backup_ids",
-        "snapshot_ids", "image", "volume_ids",
-        "size_slug", "networks", "region", "tags",
-        "client"
+        "disk", "locked", "status", "_kernel",
+        "_created_at", "features", "backup_ids",
+        "snapshot_ids", "_image", "volume_ids",
+        "size_slug", "_networks", "_region", "tags",
+        "client", "_json"
     ]
 
+    kernel = LazyField(
+        "_kernel", lambda j: Kernel(j['kernel'])
+    )
+    created_at = LazyField(
+        "_created_at", lambda j: parse_timestamp(j['created_at'])
+    )
+    image = LazyField(
+        "_image", lambda j: Image.interned(j['image'])
+    )
+    networks = LazyField(
+        "_networks", lambda j: Networks(j['networks'])
+    )
+    region = LazyField(
+        "_region", lambda j: Region.interned(j['region'])
+    )
+    _lazy_fields = (kernel, created_at, image, networks, region)
+
     def __init__(self, client, droplet_json):
         self.client = client
         self.id = droplet_json['id']
@@ -222,35 +374,15 @@ class Droplet(abc.ABC):
         else:
             self.status = Status.Other(status)
 
-        self.kernel = Kernel(
-            droplet_json['kernel']
-        )
-
-        self.created_at = dateutil.parser.parse(
-            droplet_json['created_at']
-        )
-
         self.features = droplet_json['features']
         self.backup_ids = droplet_json['backup_ids']
         self.snapshot_ids = droplet_json['snapshot_ids']
-
-        self.image = Image(
-            droplet_json['image']
-        )
-
         self.volume_ids = droplet_json['volume_ids']
         self.size_slug = droplet_json['size_slug']
-
-        self.networks = Networks(
-            droplet_json['networks']
-        )
-
-        self.region = Region(
-            droplet_json['region']
-        )
-
         self.tags = droplet_json['tags']
 
+        LazyField.setup(self, droplet_json)
+
     async def add_to_load_balancer(self, load_balancer):
         await load_balancer.add_droplets(self)
 
@@ -266,27 +398,29 @@ class Droplet(abc.ABC):
                 "Credentials invalid."
             )
         elif response.status == 404:
+            cli._untrack_droplet(self.id)
             return
         elif response.status != 204:
             raise HTTPException(
                 f"Returned the status {response.status}."
             )
+        cli._untrack_droplet(self.id)
         return True
 
     async def update(self):
-        model = self.client.droplet_model(
-            id=self.id
-        )
-        try:
-            return await model.find_one()
-        except BaseException:
-            return
+        result, = await self.client.refresh([self])
+        if isinstance(result, BaseException):
+            raise result
+        return result
+    # Gets the latest version of this droplet, or None if it was deleted.
 
-    async def enable_backups(self):
+    async def _action(self, action_type, **extra):
+        to_send = {
+            "type": action_type
+        }
+        to_send.update(extra)
         response, _json = await self.client.v2_request(
-            "POST", f"droplets/{self.id}/actions", {
-                "type": "enable_backups"
-            }
+            "POST", f"droplets/{self.id}/actions", to_send
         )
         if response.status == 403:
             raise Forbidden(
@@ -298,134 +432,34 @@ class Droplet(abc.ABC):
             raise HTTPException(
                 f"Returned the status {response.status}."
             )
-        return True
+        self.client._touch_droplets(self.id)
+        return Action(self.client, _json['action'])
+    # Runs a action on the droplet and returns the action handle.
+
+    async def enable_backups(self):
+        return await self._action("enable_backups")
 
     async def disable_backups(self):
-        response, _json = await self.client.v2_request(
-            "POST", f"droplets/{self.id}/actions", {
-                "type": "disable_backups"
-            }
-        )
-        if response.status == 403:
-            raise Forbidden(
-                "Credentials invalid."
-            )
-        elif response.status == 404:
-            return
-        elif response.status != 201:
-            raise HTTPException(
-                f"Returned the status {response.status}."
-            )
-        return True
+        return await self._action("disable_backups")
 
     async def reboot(self):
-        response, _json = await self.client.v2_request(
-            "POST", f"droplets/{self.id}/actions", {
-                "type": "reboot"
-            }
-        )
-        if response.status == 403:
-            raise Forbidden(
-                "Credentials invalid."
-            )
-        elif response.status == 404:
-            return
-        elif response.status != 201:
-            raise HTTPException(
-                f"Returned the status {response.status}."
-            )
-        return True
+        return await self._action("reboot")
 
     async def power_cycle(self):
-        response, _json = await self.client.v2_request(
-            "POST", f"droplets/{self.id}/actions", {
-                "type": "power_cycle"
-            }
-        )
-        if response.status == 403:
-            raise Forbidden(
-                "Credentials invalid."
-            )
-        elif response.status == 404:
-            return
-        elif response.status != 201:
-            raise HTTPException(
-                f"Returned the status {response.status}."
-            )
-        return True
+        return await self._action("power_cycle")
 
     async def shutdown(self):
-        response, _json = await self.client.v2_request(
-            "POST", f"droplets/{self.id}/actions", {
-                "type": "shutdown"
-            }
-        )
-        if response.status == 403:
-            raise Forbidden(
-                "Credentials invalid."
-            )
-        elif response.status == 404:
-            return
-        elif response.status != 201:
-            raise HTTPException(
-                f"Returned the status {response.status}."
-            )
-        return True
+        return await self._action("shutdown")
 
     async def power_off(self):
-        response, _json = await self.client.v2_request(
-            "POST", f"droplets/{self.id}/actions", {
-                "type": "power_off"
-            }
-        )
-        if response.status == 403:
-            raise Forbidden(
-                "Credentials invalid."
-            )
-        elif response.status == 404:
-            return
-        elif response.status != 201:
-            raise HTTPException(
-                f"Returned the status {response.status}."
-            )
-        return True
+        return await self._action("power_off")
 
     async def power_on(self):
-        response, _json = await self.client.v2_request(
-            "POST", f"droplets/{self.id}/actions", {
-                "type": "power_on"
-            }
-        )
-        if response.status == 403:
-            raise Forbidden(
-                "Credentials invalid."
-            )
-        elif response.status == 404:
-            return
-        elif response.status != 201:
-            raise HTTPException(
-                f"Returned the status {response.status}."
-            )
-        return True
+        return await self._action("power_on")
 
     async def restore(self, image_id: int):
-        response, _json = await self.client.v2_request(
-            "POST", f"droplets/{self.id}/actions", {
-                "type": "restore",
-                "image": image_id
-            }
-        )
-        if response.status == 403:
-            raise Forbidden(
-                "Credentials invalid."
-            )
-        elif response.status == 404:
-            return
-        elif response.status != 201:
-            raise HTTPException(
-                f"Returned the status {response.status}."
-            )
-        return True
+        return await self._action("restore", image=image_id)
+    # Droplet actions. Each returns a Action which can be waited on.
 # A droplet object.
 
 
@@ -434,7 +468,8 @@ class DropletModel(abc.ABC):
         self, client, id=None, name=None,
         size=None, locked=None, region=None,
         status=None, tags=None, image=None,
-        user_init=None, ssh_keys=None
+        user_init=None, ssh_keys=None, memory=None,
+        vcpus=None, disk=None, created_at=None
     ):
         self.user_init = user_init
         self.ssh_keys = ssh_keys
@@ -444,90 +479,40 @@ class DropletModel(abc.ABC):
             [id, "id"], [name, "name"],
             [size, "size"], [locked, "locked"],
             [status, "status"], [tags, "tags"],
-            [region, "region"], [image, "image"]
+            [region, "region"], [image, "image"],
+            [memory, "memory"], [vcpus, "vcpus"],
+            [disk, "disk"], [created_at, "created_at"]
         ]
         for arg in possible_args:
             if arg[0] is not None:
                 self.kwargs[arg[1]] = arg[0]
-    # Initialises the model.
-
-    async def find_one(self):
-        if "id" in self.kwargs:
-            # We'll get this droplet by ID.
-            response, _json = await self.client.v2_request(
-                "GET", f"droplets/{self.kwargs['id']}"
-            )
-            if response.status == 403:
-                raise Forbidden(
-                    "Credentials invalid."
-                )
-            elif response.status == 404:
-                return
-            elif response.status != 200:
-                raise HTTPException(
-                    f"Returned the status {response.status}."
-                )
-            else:
-                droplet = Droplet(
-                    self.client, _json['droplet']
-                )
 
-                for key in self.kwargs:
-                    if key != "id":
-                        if key == "size":
-                            if self.kwargs[key].slug !=\
-                                    droplet.__getattribute__("size_slug"):
-                                return
-                        elif key == "tags":
-                            if self.kwargs[key] not in\
-                                    droplet.__getattribute__(key):
-                                return
-                        elif self.kwargs[key] != droplet.__getattribute__(key):
-                            return
+        self._matches = compile_predicate(self.kwargs, DROPLET_FIELDS)
+        self._filters = droplet_api_filters(self.kwargs)
+    # Initialises the model. The criteria can be plain values or operators
+    # from aiodigitalocean.query, and are compiled once into a predicate.
 
-                return droplet
+    def _single_id(self):
+        _id = self.kwargs.get("id")
+        if not isinstance(_id, Operator):
+            return _id
+    # Gets the ID if the model is for exactly one droplet.
 
-        # We'll have to search all droplets.
-        response, _json = await self.client.v2_request(
-            "GET", "droplets"
-        )
+    def _api_filters(self):
+        return self._filters
+    # Gets the query parameters the API can filter droplets by.
 
-        if response.status == 403:
-            raise Forbidden(
-                "Credentials invalid."
-            )
-        elif response.status == 404:
-            return
-        elif response.status != 200:
-            raise HTTPException(
-                f"Returned the status {response.status}."
-            )
-        else:
-            for d in _json['droplets']:
-                droplet = Droplet(self.client, d)
-                result = False
-                if len(self.kwargs) == 0:
-                    result = True
-                else:
-                    for key in self.kwargs:
-                        if key == "size":
-                            if self.kwargs[key].slug !=\
-                                    droplet.__getattribute__("size_slug"):
-                                break
-                        elif key == "tags":
-                            if self.kwargs[key] not in\
-                                    droplet.__getattribute__(key):
-                                break
-                        elif self.kwargs[key] == droplet.__getattribute__(key):
-                            result = True
-                        else:
-                            break
-                if result:
-                    return droplet
+    async def find_one(self, per_page=None):
+        droplets = self.find_many(per_page)
+        try:
+            async for droplet in droplets:
+                return droplet
+        finally:
+            await droplets.aclose()
     # Tries to get a droplet matching the model. If it can't, it returns None.
 
-    async def find_many(self):
-        if "id" in self.kwargs:
+    async def find_many(self, per_page=None):
+        if self._single_id() is not None:
             # We'll get this droplet by ID.
             response, _json = await self.client.v2_request(
                 "GET", f"droplets/{self.kwargs['id']}"
@@ -546,72 +531,46 @@ class DropletModel(abc.ABC):
                 droplet = Droplet(
                     self.client, _json['droplet']
                 )
-
-                for key in self.kwargs:
-                    if key != "id":
-                        if key == "size":
-                            if self.kwargs[key].slug !=\
-                                    droplet.__getattribute__("size_slug"):
-                                return
-                        elif key == "tags":
-                            if self.kwargs[key] not in\
-                                    droplet.__getattribute__(key):
-                                return
-                        elif self.kwargs[key] != droplet.__getattribute__(key):
-                            return
-
-                yield droplet
+                if self._matches(droplet):
+                    yield droplet
                 return
 
         # We'll have to search all droplets.
-        response, _json = await self.client.v2_request(
-            "GET", "droplets"
+        pages = paginate(
+            self.client, "droplets", "droplets", per_page,
+            self._api_filters()
         )
-
-        if response.status == 403:
-            raise Forbidden(
-                "Credentials invalid."
-            )
-        elif response.status == 404:
-            return
-        elif response.status != 200:
-            raise HTTPException(
-                f"Returned the status {response.status}."
-            )
-        else:
-            for d in _json['droplets']:
+        try:
+            async for d in pages:
                 droplet = Droplet(self.client, d)
-                result = False
-                if len(self.kwargs) == 0:
-                    result = True
-                else:
-                    for key in self.kwargs:
-                        if key == "size":
-                            if self.kwargs[key].slug !=\
-                                    droplet.__getattribute__("size_slug"):
-                                break
-                        elif key == "tags":
-                            if self.kwargs[key] not in\
-                                    droplet.__getattribute__(key):
-                                break
-                        elif self.kwargs[key] == droplet.__getattribute__(key):
-                            result = True
-                        else:
-                            break
-                if result:
+                if self._matches(droplet):
                     yield droplet
+        finally:
+            # Stops the prefetch now rather than whenever it's collected.
+            await pages.aclose()
     # Tries to make a generator of droplets matching the model.
-    # If it can't, it returns None.
+    # Pages are fetched lazily, up to 200 droplets at a time.
+
+    async def snapshot(self, per_page=200, concurrency=8):
+        if self._single_id() is not None:
+            return [d async for d in self.find_many()]
+
+        droplets = await fetch_all_pages(
+            self.client, "droplets", "droplets",
+            per_page, self._api_filters(), concurrency
+        )
+        return [
+            droplet for droplet in (
+                Droplet(self.client, d) for d in droplets
+            ) if self._matches(droplet)
+        ]
+    # Gets every droplet matching the model, fetching all pages in parallel.
 
-    async def create(self, wait_for=True):
+    def _create_body(self):
         if "size" not in self.kwargs:
             raise CannotCreateDroplet(
                 "Size not found in your model."
             )
-        elif "name" not in self.kwargs:
-            raise CannotCreateDroplet(
-                "Name not found in your model."
-            )
         elif "region" not in self.kwargs:
             raise CannotCreateDroplet(
                 "Region not found in your model."
@@ -623,7 +582,6 @@ class DropletModel(abc.ABC):
 
         to_send = {
             "size": self.kwargs['size'].slug,
-            "name": self.kwargs['name'],
             "region": self.kwargs['region'].slug,
             "image": self.kwargs['image'].slug
         }
@@ -634,6 +592,18 @@ class DropletModel(abc.ABC):
         if self.user_init:
             to_send['user_data'] = self.user_init
 
+        return to_send
+    # Builds the body shared by every droplet creation request.
+
+    async def create(self, wait_for=True, timeout=600):
+        if "name" not in self.kwargs:
+            raise CannotCreateDroplet(
+                "Name not found in your model."
+            )
+
+        to_send = self._create_body()
+        to_send['name'] = self.kwargs['name']
+
         response, _json = await self.client.v2_request(
             "POST", "droplets", to_send
         )
@@ -649,21 +619,157 @@ class DropletModel(abc.ABC):
                 f"Returned the status {response.status}."
             )
 
+        self.client._track_droplet(_json['droplet'])
         if not wait_for:
             return Droplet(self.client, _json['droplet'])
 
-        _id = _json['droplet']['id']
+        return await self.client.droplet_poller.wait(
+            _json['droplet']['id'], timeout
+        )
+    # Creates a droplet. If wait_for is set, waits for it to become active,
+    # raising WaitTimeout if that takes longer than the timeout (ten minutes
+    # unless given) and CannotCreateDroplet if it disappears first.
 
-        while True:
-            await asyncio.sleep(1)
-            response, _json = await self.client.v2_request(
-                "GET", f"droplets/{_id}"
+    async def _create_chunk(self, names):
+        to_send = self._create_body()
+        to_send['names'] = names
+        response, _json = await self.client.v2_request(
+            "POST", "droplets", to_send
+        )
+
+        if response.status == 403:
+            raise Forbidden(
+                "Credentials invalid."
             )
-            if _json['droplet']['status'] == "active":
-                return Droplet(
-                    self.client, _json['droplet']
-                )
-    # Creates a droplet.
+        elif response.status != 202:
+            raise HTTPException(
+                f"Returned the status {response.status}."
+            )
+
+        return _json['droplets']
+    # Creates up to 10 droplets with one request.
+
+    async def create_many(self, names, wait_for=True, timeout=600):
+        names = list(names)
+        # Fail early rather than once per chunk.
+        self._create_body()
+
+        chunks = [
+            names[i:i + 10] for i in range(0, len(names), 10)
+        ]
+        created = await asyncio.gather(
+            *[self._create_chunk(c) for c in chunks],
+            return_exceptions=True
+        )
+
+        results = {}
+        for chunk, droplets in zip(chunks, created):
+            if isinstance(droplets, BaseException):
+                for name in chunk:
+                    results[name] = droplets
+                continue
+
+            for d in droplets:
+                self.client._track_droplet(d)
+                results[d['name']] = Droplet(self.client, d)
+            for name in chunk:
+                if name not in results:
+                    results[name] = CannotCreateDroplet(
+                        f"The API did not create {name}."
+                    )
+
+        if wait_for:
+            waiting = [
+                name for name in names
+                if isinstance(results[name], Droplet)
+            ]
+            finished = await asyncio.gather(
+                *[
+                    self.client.droplet_poller.wait(
+                        results[name].id, timeout
+                    ) for name in waiting
+                ],
+                return_exceptions=True
+            )
+            for name, result in zip(waiting, finished):
+                results[name] = result
+
+        return results
+    # Creates a droplet for each name, 10 per request with the requests sent
+    # at once. Returns a dict of name to the droplet, or the exception that
+    # stopped it being created or becoming active.
+
+    def _fleet_tag(self):
+        if list(self.kwargs) != ["tags"] or\
+                isinstance(self.kwargs['tags'], Operator):
+            raise CannotRunFleetAction(
+                "Fleet actions need a model with only tags set."
+            )
+
+        return self.kwargs['tags']
+    # Gets the tag a fleet action runs against.
+
+    async def _fleet_action(self, action_type):
+        response, _json = await self.client.v2_request(
+            "POST", build_address(
+                "droplets/actions", {"tag_name": self._fleet_tag()}
+            ), {
+                "type": action_type
+            }
+        )
+        if response.status == 403:
+            raise Forbidden(
+                "Credentials invalid."
+            )
+        elif response.status != 201:
+            raise HTTPException(
+                f"Returned the status {response.status}."
+            )
+
+        self.client._touch_tag(self._fleet_tag())
+        return [
+            Action(self.client, a) for a in _json['actions']
+        ]
+    # Runs a action on every droplet with the tag in one request.
+
+    async def power_cycle(self):
+        return await self._fleet_action("power_cycle")
+
+    async def shutdown(self):
+        return await self._fleet_action("shutdown")
+
+    async def power_off(self):
+        return await self._fleet_action("power_off")
+
+    async def power_on(self):
+        return await self._fleet_action("power_on")
+
+    async def enable_backups(self):
+        return await self._fleet_action("enable_backups")
+
+    async def disable_backups(self):
+        return await self._fleet_action("disable_backups")
+    # Fleet actions. Each returns the list of actions the API started.
+
+    async def delete(self):
+        response = await self.client.v2_request(
+            "DELETE", build_address(
+                "droplets", {"tag_name": self._fleet_tag()}
+            )
+        )
+        if isinstance(response, tuple):
+            response = response[0]
+        if response.status == 403:
+            raise Forbidden(
+                "Credentials invalid."
+            )
+        elif response.status != 204:
+            raise HTTPException(
+                f"Returned the status {response.status}."
+            )
+        self.client._untrack_tag(self._fleet_tag())
+        return True
+    # Deletes every droplet with the tag in one request.
 
 
 class ForwardingRule(abc.ABC):
@@ -739,34 +845,41 @@ class StickySessions(abc.ABC):
 class LoadBalancer(abc.ABC):
     __slots__ = [
         "client", "id", "ip", "algorithm",
-        "status", "created_at", "forwarding_rules",
-        "health_check", "sticky_sessions", "region",
+        "status", "_created_at", "_forwarding_rules",
+        "_health_check", "_sticky_sessions", "_region",
         "features", "available", "tag", "droplet_ids",
-        "redirect_http_to_https"
+        "redirect_http_to_https", "_json", "name"
     ]
 
+    created_at = LazyField(
+        "_created_at", lambda j: parse_timestamp(j['created_at'])
+    )
+    forwarding_rules = LazyField(
+        "_forwarding_rules", lambda j: [
+            ForwardingRule(r) for r in j['forwarding_rules']
+        ]
+    )
+    health_check = LazyField(
+        "_health_check", lambda j: HealthCheck(j['health_check'])
+    )
+    sticky_sessions = LazyField(
+        "_sticky_sessions", lambda j: StickySessions(j['sticky_sessions'])
+    )
+    region = LazyField(
+        "_region", lambda j: Region.interned(j['region'])
+    )
+    _lazy_fields = (
+        created_at, forwarding_rules, health_check,
+        sticky_sessions, region
+    )
+
     def __init__(self, client, balancer_json):
         self.client = client
         self.id = balancer_json['id']
+        self.name = balancer_json.get('name')
         self.ip = balancer_json['ip']
         self.algorithm = balancer_json['algorithm']
         self.status = balancer_json['status']
-        self.created_at = dateutil.parser.parse(
-            balancer_json['created_at']
-        )
-        self.forwarding_rules = [
-            ForwardingRule(r) for r in
-            balancer_json['forwarding_rules']
-        ]
-        self.health_check = HealthCheck(
-            balancer_json['health_check']
-        )
-        self.sticky_sessions = StickySessions(
-            balancer_json['sticky_sessions']
-        )
-        self.region = Region(
-            balancer_json['region']
-        )
         self.tag = balancer_json['tag'] if balancer_json['tag']\
             != "" else None
         self.droplet_ids = balancer_json['droplet_ids']
@@ -774,14 +887,14 @@ class LoadBalancer(abc.ABC):
             'redirect_http_to_https'
         ]
 
+        LazyField.setup(self, balancer_json)
+
     async def update(self):
-        model = self.client.load_balancer_model(
-            id=self.id
-        )
-        try:
-            return await model.find_one()
-        except BaseException:
-            return
+        result, = await self.client.refresh([self])
+        if isinstance(result, BaseException):
+            raise result
+        return result
+    # Gets the latest version of this load balancer, or None if it was deleted.
 
     async def add_droplets(
         self, *droplets: Droplet
@@ -848,15 +961,21 @@ class LoadBalancer(abc.ABC):
             )
     # Adds a set of forwarding rules.
 
-    async def get_droplets(self):
-        for d in self.droplet_ids:
-            m = self.client.droplet_model(
-                id=d
-            )
-            r = await m.find_one()
-            if r:
-                yield r
-    # Gets all of the droplets associated to this load balancer.
+    async def get_droplets(self, concurrency=10):
+        droplets = fetch_by_ids(
+            self.client, self.droplet_ids, "droplets",
+            "droplet", concurrency
+        )
+        try:
+            async for _, d in droplets:
+                if isinstance(d, BaseException):
+                    raise d
+                elif d is not None:
+                    yield Droplet(self.client, d)
+        finally:
+            await droplets.aclose()
+    # Gets all of the droplets associated to this load balancer, yielding
+    # them as they arrive.
 
 
 class LoadBalancerModel(abc.ABC):
@@ -881,86 +1000,39 @@ class LoadBalancerModel(abc.ABC):
             if arg[0] is not None:
                 self.kwargs[arg[1]] = arg[0]
         if droplets:
-            self.kwargs['droplets'] = []
+            self.kwargs['droplet_ids'] = []
             for d in droplets:
                 try:
                     self.kwargs['droplet_ids'].append(d.id)
                 except AttributeError:
                     self.kwargs['droplet_ids'].append(d)
-    # Initialises the model.
-
-    async def find_one(self):
-        if "id" in self.kwargs:
-            # We'll get this load balancer by ID.
-            response, _json = await self.client.v2_request(
-                "GET", f"load_balancers/{self.kwargs['id']}"
-            )
-            if response.status == 403:
-                raise Forbidden(
-                    "Credentials invalid."
-                )
-            elif response.status == 404:
-                return
-            elif response.status != 200:
-                raise HTTPException(
-                    f"Returned the status {response.status}."
-                )
-            else:
-                balancer = LoadBalancer(
-                    self.client, _json['load_balancer']
-                )
-
-                for key in self.kwargs:
-                    if key != "id":
-                        if key == "forwarding_rules":
-                            if self.kwargs[key] not in\
-                                    balancer.__getattribute__(key):
-                                return
-                        elif self.kwargs[key] !=\
-                                balancer.__getattribute__(key):
-                            return
 
+        criteria = dict(self.kwargs)
+        if "droplet_ids" in criteria:
+            criteria['droplet_ids'] = AllOf(*criteria['droplet_ids'])
+        self._matches = compile_predicate(criteria, LOAD_BALANCER_FIELDS)
+    # Initialises the model. The criteria can be plain values or operators
+    # from aiodigitalocean.query, and are compiled once into a predicate.
+
+    def _single_id(self):
+        _id = self.kwargs.get("id")
+        if not isinstance(_id, Operator):
+            return _id
+    # Gets the ID if the model is for exactly one load balancer.
+
+    async def find_one(self, per_page=None):
+        balancers = self.find_many(per_page)
+        try:
+            async for balancer in balancers:
                 return balancer
+        finally:
+            await balancers.aclose()
+    # Tries to get a load balancer matching the model.
+    # If it can't, it returns None.
 
-        # We'll have to search all load balancers.
-        response, _json = await self.client.v2_request(
-            "GET", "load_balancers"
-        )
-
-        if response.status == 403:
-            raise Forbidden(
-                "Credentials invalid."
-            )
-        elif response.status == 404:
-            return
-        elif response.status != 200:
-            raise HTTPException(
-                f"Returned the status {response.status}."
-            )
-        else:
-            for d in _json['load_balancers']:
-                balancer = LoadBalancer(self.client, d)
-                result = False
-                if len(self.kwargs) == 0:
-                    result = True
-                else:
-                    for key in self.kwargs:
-                        if key == "forwarding_rules":
-                            if self.kwargs[key] not in\
-                                    balancer.__getattribute__(key):
-                                return
-                        elif self.kwargs[key] !=\
-                                balancer.__getattribute__(key):
-                            return
-                        else:
-                            break
-                if result:
-                    return balancer
-    # Tries to get a droplet matching the model. If it can't, it returns None.
-
-    async def find_many(self):
-        if "id" in self.kwargs:
-            # We'll get this droplet by ID.
+    async def find_many(self, per_page=None):
+        if self._single_id() is not None:
+            # We'll get this load balancer by ID.
             response, _json = await self.client.v2_request(
                 "GET", f"load_balancers/{self.kwargs['id']}"
             )
@@ -978,56 +1050,40 @@ class LoadBalancerModel(abc.ABC):
                 balancer = LoadBalancer(
                     self.client, _json['load_balancer']
                 )
-
-                for key in self.kwargs:
-                    if key != "id":
-                        if key == "forwarding_rules":
-                            if self.kwargs[key] not in\
-                                    balancer.__getattribute__(key):
-                                return
-                        elif self.kwargs[key] !=\
-                                balancer.__getattribute__(key):
-                            return
-
-                yield balancer
+                if self._matches(balancer):
+                    yield balancer
                 return
 
         # We'll have to search all load balancers.
-        response, _json = await self.client.v2_request(
-            "GET", "load_balancers"
+        pages = paginate(
+            self.client, "load_balancers", "load_balancers", per_page
         )
-
-        if response.status == 403:
-            raise Forbidden(
-                "Credentials invalid."
-            )
-        elif response.status == 404:
-            return
-        elif response.status != 200:
-            raise HTTPException(
-                f"Returned the status {response.status}."
-            )
-        else:
-            for b in _json['load_balancers']:
+        try:
+            async for b in pages:
                 balancer = LoadBalancer(self.client, b)
-                result = False
-                if len(self.kwargs) == 0:
-                    result = True
-                else:
-                    for key in self.kwargs:
-                        if key == "forwarding_rules":
-                            if self.kwargs[key] not in\
-                                    balancer.__getattribute__(key):
-                                break
-                        elif self.kwargs[key] ==\
-                                balancer.__getattribute__(key):
-                            result = True
-                        else:
-                            break
-                if result:
+                if self._matches(balancer):
                     yield balancer
-    # Tries to make a generator of droplets matching the load balancers.
-    # If it can't, it returns None.
+        finally:
+            # Stops the prefetch now rather than whenever it's collected.
+            await pages.aclose()
+    # Tries to make a generator of load balancers matching the model.
+    # Pages are fetched lazily, up to 200 load balancers at a time.
+
+    async def snapshot(self, per_page=200, concurrency=8):
+        if self._single_id() is not None:
+            return [b async for b in self.find_many()]
+
+        balancers = await fetch_all_pages(
+            self.client, "load_balancers", "load_balancers",
+            per_page, concurrency=concurrency
+        )
+        return [
+            balancer for balancer in (
+                LoadBalancer(self.client, b) for b in balancers
+            ) if self._matches(balancer)
+        ]
+    # Gets every load balancer matching the model, fetching all pages in
+    # parallel.
 
     async def create(self):
         if "name" not in self.kwargs:
@@ -1212,5 +1268,5 @@ class Size(abc.ABC):
 
     async def get_regions(self):
         for r in self.region_slugs:
-            yield self.client.get_region(r)
+            yield await self.client.get_region(r)
 # A class for a size object.
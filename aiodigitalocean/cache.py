@@ -0,0 +1,199 @@
+"""
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+import time
+from operator import itemgetter
+from .abc import Region, Image, Size
+from .pagination import fetch_all_pages
+# Imports go here.
+
+
+def get_slug(_j):
+    if not _j['slug']:
+        return ""
+
+    return _j['slug'].lower()
+# Gets the slug.
+
+
+class CatalogCache:
+    KINDS = {
+        "regions": ("regions", None),
+        "sizes": ("sizes", None),
+        "images": ("images", {"type": "distribution"})
+    }
+    # The listing path and query parameters for each catalog.
+
+    SNAPSHOT_VERSION = 1
+    # Bumped whenever the snapshot file layout changes.
+
+    def __init__(self, client, ttl=3600, path=None):
+        self.client = client
+        self.ttl = ttl
+        self.path = path
+        self._refresh_task = None
+        self._raw = {}
+        self._objects = {}
+        self._index = {}
+        self._expires = {}
+        self._locks = {}
+    # Initialises the cache.
+
+    def _build(self, kind, items):
+        if kind == "regions":
+            objects = [Region.interned(r) for r in items]
+        elif kind == "sizes":
+            objects = [Size(self.client, s) for s in items]
+        else:
+            objects = [Image.interned(i) for i in items]
+
+        self._raw[kind] = items
+        self._objects[kind] = objects
+        self._index[kind] = {
+            get_slug(j): o for j, o in zip(items, objects)
+        }
+    # Builds the objects and the slug index for a catalog.
+
+    def fresh(self, kind):
+        return kind in self._objects and\
+            self._expires.get(kind, 0) > time.time()
+    # Checks if a catalog is cached and has not expired.
+
+    async def _load(self, kind):
+        if kind not in self._locks:
+            self._locks[kind] = asyncio.Lock()
+
+        async with self._locks[kind]:
+            # Somebody else may have refreshed it whilst we waited.
+            if self.fresh(kind):
+                return
+
+            path, params = self.KINDS[kind]
+            items = await fetch_all_pages(
+                self.client, path, kind, params=params,
+                item_key=itemgetter("slug")
+            )
+            self._build(kind, items)
+            self._expires[kind] = time.time() + self.ttl
+    # Downloads a catalog. Concurrent callers share the one download.
+
+    async def _refresh(self):
+        try:
+            for kind in self.KINDS:
+                if not self.fresh(kind):
+                    await self._load(kind)
+            self.save()
+        except Exception:
+            # Nobody is waiting on this, so keep serving the stale snapshot
+            # and try again on the next read.
+            pass
+        finally:
+            self._refresh_task = None
+    # Refreshes every stale catalog and writes the snapshot back out.
+
+    async def _ensure(self, kind):
+        if self.fresh(kind):
+            return
+
+        if self.path and kind in self._objects:
+            # Serve the stale snapshot and refresh it in the background.
+            if self._refresh_task is None:
+                self._refresh_task = asyncio.ensure_future(
+                    self._refresh()
+                )
+            return
+
+        await self._load(kind)
+        if self.path:
+            self.save()
+    # Makes sure a catalog is there to be read.
+
+    async def get(self, kind):
+        await self._ensure(kind)
+        return self._objects[kind]
+    # Gets every object in a catalog.
+
+    async def find(self, kind, slug):
+        await self._ensure(kind)
+        return self._index[kind].get(slug.lower())
+    # Gets a object from a catalog by slug. Returns None if it isn't there.
+
+    def invalidate(self, kind=None):
+        kinds = [kind] if kind else list(self.KINDS)
+        for k in kinds:
+            self._expires.pop(k, None)
+    # Marks one (or every) catalog as needing a download.
+
+    def stop(self):
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+    # Stops any background refresh.
+
+    def save(self, path=None):
+        path = path or self.path
+        if not path or not self._raw:
+            return False
+
+        snapshot = {
+            "version": self.SNAPSHOT_VERSION,
+            "expires_at": {
+                k: self._expires.get(k, 0) for k in self._raw
+            },
+            "catalogs": self._raw
+        }
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(snapshot, f)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        return True
+    # Writes the cached catalogs to a file. The file is swapped in whole so
+    # a reader never sees half of it.
+
+    def load(self, path=None):
+        path = path or self.path
+        if not path:
+            return False
+
+        try:
+            with open(path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        if not isinstance(snapshot, dict) or\
+                snapshot.get('version') != self.SNAPSHOT_VERSION:
+            return False
+
+        expires_at = snapshot.get('expires_at') or {}
+        for kind, items in (snapshot.get('catalogs') or {}).items():
+            if kind in self.KINDS:
+                self._build(kind, items)
+                self._expires[kind] = expires_at.get(kind, 0)
+        return True
+    # Loads catalogs from a snapshot file. Returns False if the file is
+    # missing, unreadable or from a different snapshot version.
+# A in-memory cache of the regions, sizes and images catalogs.
@@ -16,24 +16,56 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 """
 
 import os
+import time
+import asyncio
 import aiohttp
+try:
+    from orjson import loads as default_json_loads
+except ImportError:
+    from json import loads as default_json_loads
 from .abc import DropletModel, LoadBalancerModel,\
-    Region, Image, User, ForwardingRule, SSHKey, Size
+    User, ForwardingRule, SSHKey, Droplet, LoadBalancer
 from .exceptions import EnvVariableNotFound, Forbidden,\
-    HTTPException
+    HTTPException, ClientClosed
+from .ratelimit import RateLimiter
+from .retry import RetryPolicy
+from .cache import CatalogCache, get_slug
+from .pagination import fetch_by_ids
+from .poller import DropletPoller, ActionPoller
+from .inventory import DropletInventory
+from .watch import DropletWatcher
 # Imports go here.
 
 
-def get_slug(_j):
-    if not _j['slug']:
-        return ""
-
-    return _j['slug'].lower()
-# Gets the slug.
-
-
 class Client:
-    def __init__(self, api_key):
+    def __init__(
+        self, api_key, limit=100, limit_per_host=0,
+        keepalive_timeout=30, ttl_dns_cache=300,
+        retry_policy=None, catalog_ttl=3600, catalog_path=None,
+        lazy_models=False, json_loads=None, metrics=None
+    ):
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.ttl_dns_cache = ttl_dns_cache
+        self.lazy_models = lazy_models
+        self.json_loads = json_loads or default_json_loads
+        self._session = None
+        self._closed = False
+        self._in_flight = {}
+        self.metrics = metrics
+        self.rate_limiter = RateLimiter()
+        if retry_policy is None:
+            retry_policy = RetryPolicy()
+        self.retry_policy = retry_policy
+        self.catalog = CatalogCache(self, catalog_ttl, catalog_path)
+        if catalog_path:
+            self.catalog.load()
+        self.droplet_poller = DropletPoller(self)
+        self.action_poller = ActionPoller(self)
+        self.inventory = None
+        self.droplet_watcher = DropletWatcher(self)
+
         if api_key is None:
             try:
                 self.api_key = os.environ[
@@ -51,64 +83,226 @@ class Client:
         self.api_key = api_key
     # Initialises a client.
 
-    async def v2_request(self, method, address, data=None):
-        async with aiohttp.ClientSession() as session:
-            if method == "GET":
-                async with session.get(
-                    f"https://api.digitalocean.com/v2/{address}",
-                    headers={
-                        "Authorization": f"Bearer {self.api_key}"
-                    }
-                ) as response:
-                    try:
-                        return response, (await response.json())
-                    except aiohttp.client_exceptions.ContentTypeError:
-                        return response
-            elif method == "POST":
-                async with session.post(
-                    f"https://api.digitalocean.com/v2/{address}",
-                    headers={
-                        "Authorization": f"Bearer {self.api_key}"
-                    },
-                    data=data
-                ) as response:
-                    try:
-                        return response, (await response.json())
-                    except aiohttp.client_exceptions.ContentTypeError:
-                        return response
-            elif method == "DELETE":
-                async with session.delete(
-                    f"https://api.digitalocean.com/v2/{address}",
-                    headers={
-                        "Authorization": f"Bearer {self.api_key}"
-                    }
-                ) as response:
-                    try:
-                        return response, (await response.json())
-                    except aiohttp.client_exceptions.ContentTypeError:
-                        return response
-            elif method == "PUT":
-                async with session.put(
-                    f"https://api.digitalocean.com/v2/{address}",
-                    headers={
-                        "Authorization": f"Bearer {self.api_key}"
-                    }
-                ) as response:
-                    try:
-                        return response, (await response.json())
-                    except aiohttp.client_exceptions.ContentTypeError:
-                        return response
-    # Runs a API V2 request.
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    @property
+    def session(self):
+        if self._closed:
+            raise ClientClosed(
+                "The client was closed."
+            )
+        elif self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit,
+                limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.ttl_dns_cache
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers={
+                    "Authorization": f"Bearer {self.api_key}"
+                }
+            )
+        return self._session
+    # Gets the pooled session, creating it on first use. Raises
+    # ClientClosed once the client has been closed.
+
+    async def close(self):
+        if self.inventory is not None:
+            self.inventory.stop()
+        self.droplet_watcher.stop()
+        self.droplet_poller.stop()
+        self.action_poller.stop()
+        self.catalog.stop()
+        self._closed = True
+        for future, _ in list(self._in_flight.values()):
+            future.cancel()
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+    # Closes the pooled session and all of its connections.
+
+    async def _v2_request_once(self, method, address, data):
+        await self.rate_limiter.acquire()
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.started()
+            started = time.monotonic()
+        try:
+            async with self.session.request(
+                method, f"https://api.digitalocean.com/v2/{address}",
+                json=data
+            ) as response:
+                self.rate_limiter.update(response.headers, response.status)
+                body = await response.read()
+        except Exception:
+            if metrics is not None:
+                metrics.observe(
+                    method, address, None, time.monotonic() - started, None
+                )
+            raise
+        finally:
+            if metrics is not None:
+                metrics.finished()
+
+        if metrics is not None:
+            metrics.observe(
+                method, address, response.status,
+                time.monotonic() - started, len(body)
+            )
+            metrics.update_rate_limit(
+                self.rate_limiter.limit, self.rate_limiter.remaining
+            )
+
+        content_type = response.content_type
+        if content_type != "application/json" and\
+                not content_type.endswith("+json"):
+            return response
+        elif not body.strip():
+            return response, None
+
+        return response, self.json_loads(body)
+    # Runs a single attempt of a API V2 request. The body is read once as
+    # bytes and handed straight to the JSON decoder (orjson if installed).
+    # Every attempt is recorded in the metrics if there are any.
+
+    def _forget_in_flight(self, key, future):
+        self._in_flight.pop(key, None)
+        if not future.cancelled():
+            # Marks the error as seen in case every waiter went away.
+            future.exception()
+    # Drops a finished request from the single-flight table.
+
+    async def _join_in_flight(self, entry):
+        entry[1] += 1
+        try:
+            return await asyncio.shield(entry[0])
+        except asyncio.CancelledError:
+            # Nobody else wants it, so stop the request too.
+            if entry[1] == 1 and not entry[0].done():
+                entry[0].cancel()
+            raise
+        finally:
+            entry[1] -= 1
+    # Waits on a shared request, cancelling it if the last waiter gives up.
+
+    async def v2_request(self, method, address, data=None, retry=None):
+        if method != "GET":
+            return await self._v2_request(method, address, data, retry)
+
+        key = (method, address)
+        entry = self._in_flight.get(key)
+        if entry is None:
+            future = asyncio.ensure_future(
+                self._v2_request(method, address, data, retry)
+            )
+            entry = self._in_flight[key] = [future, 0]
+            future.add_done_callback(
+                lambda f: self._forget_in_flight(key, f)
+            )
+        return await self._join_in_flight(entry)
+    # Runs a API V2 request. Identical GETs that are in flight at the same
+    # time share one request and one parsed response.
+
+    async def _v2_request(self, method, address, data=None, retry=None):
+        policy = self.retry_policy if retry is None else retry
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                result = await self._v2_request_once(
+                    method, address, data
+                )
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if not policy or not policy.allows(method, attempt):
+                    raise
+                wait = policy.delay(attempt, started)
+                if wait is None:
+                    raise
+                if self.metrics is not None:
+                    self.metrics.retried(method, address)
+                await asyncio.sleep(wait)
+                continue
+
+            response = result[0] if isinstance(result, tuple) else result
+            if policy and policy.allows(method, attempt, response.status):
+                wait = policy.delay(
+                    attempt, started, response.headers.get("Retry-After")
+                )
+                if wait is not None:
+                    if self.metrics is not None:
+                        self.metrics.retried(method, address)
+                    await asyncio.sleep(wait)
+                    continue
+
+            return result
+    # Runs a API V2 request, retrying failures the retry policy allows.
+    # Pass retry=False to turn retries off or a RetryPolicy to override it.
+
+    async def droplet_inventory(self, interval=60):
+        if self.inventory is None:
+            inventory = DropletInventory(self, interval)
+            await inventory.sync()
+            if self.inventory is None:
+                self.inventory = inventory
+        self.inventory.start()
+        return self.inventory
+    # Gets the local droplet inventory, building it on first use. It is
+    # resynced every interval and kept up to date with our own changes.
+
+    async def watch_droplets(self, interval=30, filters=None):
+        async for event in self.droplet_watcher.watch(interval, filters):
+            yield event
+    # Yields DropletAdded, DropletRemoved and DropletChanged events as the
+    # droplets change. Filters takes the same criteria as a droplet model.
+    # Every watch with the same API filters shares one poll loop.
+
+    async def get_droplets_by_ip(self, address, _type=None):
+        inventory = await self.droplet_inventory()
+        if "/" in address:
+            return inventory.in_network(address, _type)
+        return inventory.by_ip(address, _type)
+    # Gets the droplets with the IP address, or with a address in the range
+    # if given in CIDR form. Builds the droplet inventory on first use.
+
+    def _track_droplet(self, droplet_json):
+        if self.inventory is not None:
+            self.inventory.upsert(droplet_json)
+
+    def _untrack_droplet(self, _id):
+        if self.inventory is not None:
+            self.inventory.remove(_id)
+
+    def _touch_droplets(self, *ids):
+        if self.inventory is not None:
+            self.inventory.invalidate(*ids)
+
+    def _touch_tag(self, tag):
+        if self.inventory is not None:
+            self.inventory.invalidate_tag(tag)
+
+    def _untrack_tag(self, tag):
+        if self.inventory is not None:
+            self.inventory.remove_tag(tag)
+    # Writes our own changes through to the inventory if there is one.
 
     def droplet_model(
             self, id=None, name=None, size=None, locked=None,
             status=None, tags=None, region=None, image=None,
-            user_init=None, ssh_keys=None
+            user_init=None, ssh_keys=None, memory=None,
+            vcpus=None, disk=None, created_at=None
     ):
         return DropletModel(
             self, id, name, size, locked,
             region, status, tags, image,
-            user_init, ssh_keys
+            user_init, ssh_keys, memory,
+            vcpus, disk, created_at
         )
     # Creates a droplet model without having to specify the client.
 
@@ -125,26 +319,52 @@ class Client:
         )
     # Creates a load balancer model without having to specify the client.
 
-    async def get_region(self, region_slug):
-        region_slug = region_slug.lower()
-        resp, _j = await self.v2_request(
-            "GET", "regions"
+    async def _refresh_group(self, objects, cls, path, key, concurrency):
+        results = {}
+        async for _id, _j in fetch_by_ids(
+            self, [o.id for o in objects], path, key, concurrency
+        ):
+            if _j is None or isinstance(_j, BaseException):
+                results[_id] = _j
+            else:
+                results[_id] = cls(self, _j)
+        return results
+    # Refreshes objects of one type, keyed by ID.
+
+    async def refresh(self, objects, concurrency=10):
+        objects = list(objects)
+        droplets = [o for o in objects if isinstance(o, Droplet)]
+        balancers = [o for o in objects if isinstance(o, LoadBalancer)]
+        for o in objects:
+            if not isinstance(o, (Droplet, LoadBalancer)):
+                raise TypeError(
+                    f"Cannot refresh a {type(o).__name__}."
+                )
+
+        by_droplet, by_balancer = await asyncio.gather(
+            self._refresh_group(
+                droplets, Droplet, "droplets", "droplet", concurrency
+            ),
+            self._refresh_group(
+                balancers, LoadBalancer, "load_balancers",
+                "load_balancer", concurrency
+            )
         )
-        regions = _j['regions']
-        for r in regions:
-            if get_slug(r) == region_slug:
-                return Region(r)
+        return [
+            (by_droplet if isinstance(o, Droplet) else by_balancer)[o.id]
+            for o in objects
+        ]
+    # Gets the latest version of many droplets and load balancers with as
+    # few requests as possible. Returns a list in the same order holding the
+    # new object, None if it no longer exists, or the exception raised
+    # whilst getting it.
+
+    async def get_region(self, region_slug):
+        return await self.catalog.find("regions", region_slug)
     # Gets the region by slug.
 
     async def get_image(self, image_slug):
-        image_slug = image_slug.lower()
-        resp, _j = await self.v2_request(
-            "GET", "images?type=distribution"
-        )
-        images = _j['images']
-        for i in images:
-            if get_slug(i) == image_slug:
-                return Image(i)
+        return await self.catalog.find("images", image_slug)
     # Gets the image by slug.
 
     async def get_user(self):
@@ -244,74 +464,20 @@ class Client:
     # Creates a SSH key.
 
     async def images(self):
-        response, _j = await self.v2_request(
-            "GET", "images?type=distribution"
-        )
-        images = _j['images']
-        if response.status == 403:
-            raise Forbidden(
-                "Credentials invalid."
-            )
-        elif response.status != 200:
-            raise HTTPException(
-                f"Returned the status {response.status}."
-            )
-        else:
-            for i in images:
-                yield Image(i)
+        for i in await self.catalog.get("images"):
+            yield i
     # Gets all of the images.
 
     async def regions(self):
-        response, _j = await self.v2_request(
-            "GET", "regions"
-        )
-        regions = _j['regions']
-        if response.status == 403:
-            raise Forbidden(
-                "Credentials invalid."
-            )
-        elif response.status != 200:
-            raise HTTPException(
-                f"Returned the status {response.status}."
-            )
-        else:
-            for r in regions:
-                yield Region(r)
+        for r in await self.catalog.get("regions"):
+            yield r
     # Gets all of the regions.
 
     async def sizes(self):
-        response, _j = await self.v2_request(
-            "GET", "sizes"
-        )
-        sizes = _j['sizes']
-        if response.status == 403:
-            raise Forbidden(
-                "Credentials invalid."
-            )
-        elif response.status != 200:
-            raise HTTPException(
-                f"Returned the status {response.status}."
-            )
-        else:
-            for s in sizes:
-                yield Size(self, s)
+        for s in await self.catalog.get("sizes"):
+            yield s
     # Gets a list of VPS sizes.
 
     async def get_size(self, size_slug):
-        response, _j = await self.v2_request(
-            "GET", "sizes"
-        )
-        sizes = _j['sizes']
-        if response.status == 403:
-            raise Forbidden(
-                "Credentials invalid."
-            )
-        elif response.status != 200:
-            raise HTTPException(
-                f"Returned the status {response.status}."
-            )
-        else:
-            for s in sizes:
-                if s['slug'] == size_slug:
-                    return Size(self, s)
+        return await self.catalog.find("sizes", size_slug)
     # Gets a size by slug.
@@ -34,3 +34,15 @@ class EnvVariableNotFound(Exception):
 
 class CannotCreateLoadBalancer(Exception):
     pass
+
+
+class WaitTimeout(Exception):
+    pass
+
+
+class CannotRunFleetAction(Exception):
+    pass
+
+
+class ClientClosed(Exception):
+    pass
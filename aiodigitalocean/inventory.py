@@ -0,0 +1,356 @@
+"""
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+import asyncio
+import ipaddress
+import time
+from bisect import bisect_left, bisect_right, insort
+from .abc import Droplet, Status
+from .pagination import fetch_all_pages, fetch_by_ids
+from .query import slug_of
+# Imports go here.
+
+
+def status_key(status):
+    if isinstance(status, str):
+        return status
+    elif isinstance(status, Status.Other):
+        return status.status
+
+    return status.__name__.lower()
+# Gets the API status string for a status given as a string or Status.
+
+
+class AddressIndex:
+    def __init__(self):
+        self._entries = {}
+        self._exact = {}
+        self._sorted = {4: [], 6: []}
+    # Initialises a empty index.
+
+    @staticmethod
+    def _entries_for(networks):
+        entries = {}
+        for network in networks.ipv4 + networks.ipv6:
+            try:
+                address = ipaddress.ip_address(network.ip_address)
+            except ValueError:
+                continue
+            entries.setdefault(address, network.type)
+        return frozenset(entries.items())
+    # Gets the addresses and network types of a droplet's networks.
+
+    def _add(self, _id, address, _type):
+        self._exact.setdefault(address, {})[_id] = _type
+        insort(self._sorted[address.version], (int(address), _id, _type))
+
+    def _discard(self, _id, address, _type):
+        ids = self._exact[address]
+        del ids[_id]
+        if not ids:
+            del self._exact[address]
+
+        entries = self._sorted[address.version]
+        del entries[bisect_left(entries, (int(address), _id))]
+    # Adds or drops one address of a droplet.
+
+    def update(self, _id, networks):
+        old = self._entries.get(_id, frozenset())
+        new = self._entries_for(networks)
+        # Only the addresses which moved are touched.
+        for address, _type in old - new:
+            self._discard(_id, address, _type)
+        for address, _type in new - old:
+            self._add(_id, address, _type)
+
+        if new:
+            self._entries[_id] = new
+        else:
+            self._entries.pop(_id, None)
+    # Sets the addresses of a droplet from its networks.
+
+    def remove(self, _id):
+        for address, _type in self._entries.pop(_id, ()):
+            self._discard(_id, address, _type)
+    # Drops every address of a droplet.
+
+    def lookup(self, address, _type=None):
+        try:
+            address = ipaddress.ip_address(address)
+        except ValueError:
+            return set()
+
+        return {
+            _id for _id, t in self._exact.get(address, {}).items()
+            if _type is None or t is _type
+        }
+    # Gets the IDs of the droplets with the exact address.
+
+    def within(self, cidr, _type=None):
+        network = ipaddress.ip_network(cidr, strict=False)
+        entries = self._sorted[network.version]
+        low = bisect_left(entries, (int(network.network_address),))
+        high = bisect_right(
+            entries, (int(network.broadcast_address) + 1,)
+        )
+        return {
+            _id for _, _id, t in entries[low:high]
+            if _type is None or t is _type
+        }
+    # Gets the IDs of the droplets with a address in the CIDR range.
+# A reverse index from IPv4 and IPv6 addresses to droplet IDs. Addresses
+# are also kept sorted by number so CIDR ranges are two binary searches.
+
+
+class DropletInventory:
+    INDEXES = ("tag", "region", "status", "size", "name")
+    # The fields droplets are indexed by.
+
+    def __init__(self, client, interval=60, flush_delay=1):
+        self.client = client
+        self.interval = interval
+        self.flush_delay = flush_delay
+        self.synced_at = None
+        self._droplets = {}
+        self._raw = {}
+        self._keys = {}
+        self._index = {name: {} for name in self.INDEXES}
+        self.addresses = AddressIndex()
+        self._dirty = set()
+        self._touched = None
+        self._sync_task = None
+        self._flush_task = None
+    # Initialises a empty inventory.
+
+    def __len__(self):
+        return len(self._droplets)
+
+    def __contains__(self, _id):
+        return _id in self._droplets
+
+    @staticmethod
+    def _keys_for(droplet_json):
+        return {
+            "tag": frozenset(droplet_json['tags']),
+            "region": frozenset([
+                (droplet_json.get('region') or {}).get('slug')
+            ]),
+            "status": frozenset([droplet_json['status']]),
+            "size": frozenset([droplet_json['size_slug']]),
+            "name": frozenset([droplet_json['name']])
+        }
+    # Gets the index keys for a droplet.
+
+    def _reindex(self, _id, old, new):
+        for name in self.INDEXES:
+            before = old[name] if old else frozenset()
+            after = new[name] if new else frozenset()
+            index = self._index[name]
+            for key in before - after:
+                ids = index[key]
+                ids.discard(_id)
+                if not ids:
+                    del index[key]
+            for key in after - before:
+                index.setdefault(key, set()).add(_id)
+    # Moves a droplet between index keys, touching only what changed.
+
+    def _touch(self, _id):
+        if self._touched is not None:
+            self._touched.add(_id)
+    # Notes a id changed by us whilst a sync is running, so the sync's
+    # listing (which may have started earlier) doesn't undo it.
+
+    def upsert(self, droplet_json):
+        self._touch(droplet_json['id'])
+        return self._apply(droplet_json)
+    # Adds or updates a droplet. Returns False if nothing changed.
+
+    def _apply(self, droplet_json):
+        _id = droplet_json['id']
+        if self._raw.get(_id) == droplet_json:
+            return False
+
+        keys = self._keys_for(droplet_json)
+        self._reindex(_id, self._keys.get(_id), keys)
+        self._keys[_id] = keys
+        self._raw[_id] = droplet_json
+        droplet = self._droplets[_id] = Droplet(self.client, droplet_json)
+        self.addresses.update(_id, droplet.networks)
+        return True
+    # Stores a droplet and updates the indexes if its JSON changed.
+
+    def remove(self, _id):
+        self._touch(_id)
+        if _id not in self._droplets:
+            return False
+
+        self._reindex(_id, self._keys.pop(_id), None)
+        self.addresses.remove(_id)
+        del self._raw[_id]
+        del self._droplets[_id]
+        self._dirty.discard(_id)
+        return True
+    # Removes a droplet. Returns False if it wasn't there.
+
+    def ids(self, tag=None, region=None, status=None, size=None, name=None):
+        wanted = []
+        for index, key in (
+            ("tag", tag), ("region", slug_of(region)),
+            ("status", None if status is None else status_key(status)),
+            ("size", slug_of(size)), ("name", name)
+        ):
+            if key is not None:
+                wanted.append(self._index[index].get(key, ()))
+
+        if not wanted:
+            return set(self._droplets)
+
+        # Start from the smallest set so the intersection is cheap.
+        wanted.sort(key=len)
+        result = set(wanted[0])
+        for ids in wanted[1:]:
+            result.intersection_update(ids)
+            if not result:
+                break
+        return result
+    # Gets the IDs of the droplets matching every criteria given.
+
+    def query(
+        self, tag=None, region=None, status=None, size=None, name=None
+    ):
+        return [
+            self._droplets[_id] for _id in
+            self.ids(tag, region, status, size, name)
+        ]
+    # Gets the droplets matching every criteria given, without any API calls.
+
+    def by_ip(self, address, _type=None):
+        return [
+            self._droplets[_id] for _id in
+            self.addresses.lookup(address, _type)
+        ]
+    # Gets the droplets with the exact IP address. Pass a NetworkType to
+    # only match public or private addresses.
+
+    def in_network(self, cidr, _type=None):
+        return [
+            self._droplets[_id] for _id in
+            self.addresses.within(cidr, _type)
+        ]
+    # Gets the droplets with a IP address in the CIDR range, such as
+    # "10.0.0.0/8" or "2604:a880::/32".
+
+    def get(self, _id):
+        return self._droplets.get(_id)
+    # Gets a droplet by ID, or None if it isn't in the inventory.
+
+    async def sync(self):
+        touched = self._touched = set()
+        try:
+            droplets = await fetch_all_pages(
+                self.client, "droplets", "droplets"
+            )
+        finally:
+            self._touched = None
+
+        seen = set()
+        changed = 0
+        for d in droplets:
+            seen.add(d['id'])
+            if d['id'] not in touched and self._apply(d):
+                changed += 1
+
+        missing = [
+            _id for _id in self._droplets
+            if _id not in seen and _id not in touched
+        ]
+        self.invalidate(*missing)
+        self.synced_at = time.time()
+        return changed, len(missing)
+    # Resyncs with the API. Only droplets whose JSON changed are rebuilt and
+    # reindexed. Droplets we changed whilst the listing was read are left
+    # alone, and ones missing from it are fetched again by ID rather than
+    # dropped straight away. Returns how many changed and how many went
+    # missing.
+
+    def invalidate(self, *ids):
+        for _id in ids:
+            self._touch(_id)
+        self._dirty.update(i for i in ids if i in self._droplets)
+        if self._dirty and self._flush_task is None:
+            self._flush_task = asyncio.ensure_future(self._flush())
+    # Marks droplets as changed by something we did, so they get fetched
+    # again shortly.
+
+    def invalidate_tag(self, tag):
+        self.invalidate(*self._index['tag'].get(tag, ()))
+    # Marks every droplet with the tag as changed.
+
+    def remove_tag(self, tag):
+        for _id in list(self._index['tag'].get(tag, ())):
+            self.remove(_id)
+    # Removes every droplet with the tag.
+
+    async def _flush(self):
+        try:
+            # Wait a moment so a burst of changes is fetched together.
+            await asyncio.sleep(self.flush_delay)
+            ids, self._dirty = self._dirty, set()
+            async for _id, d in fetch_by_ids(
+                self.client, ids, "droplets", "droplet"
+            ):
+                if isinstance(d, BaseException):
+                    # Leave it for the next full sync.
+                    continue
+                elif d is None:
+                    self.remove(_id)
+                else:
+                    self.upsert(d)
+        finally:
+            self._flush_task = None
+
+        if self._dirty:
+            self.invalidate()
+    # Fetches the droplets which were marked as changed.
+
+    async def _run(self):
+        if self.synced_at is not None:
+            await asyncio.sleep(self.interval)
+        while True:
+            try:
+                await self.sync()
+            except Exception:
+                # Keep answering from what we have and try again next time.
+                pass
+            await asyncio.sleep(self.interval)
+    # Resyncs every interval until stopped. Waits a interval first if it
+    # has already been synced.
+
+    def start(self):
+        if self._sync_task is None:
+            self._sync_task = asyncio.ensure_future(self._run())
+    # Starts resyncing in the background.
+
+    def stop(self):
+        for task in (self._sync_task, self._flush_task):
+            if task is not None:
+                task.cancel()
+        self._sync_task = None
+        self._flush_task = None
+    # Stops resyncing in the background.
+# A local droplet inventory indexed by tag, region, status, size and name.
@@ -0,0 +1,192 @@
+"""
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+import re
+from bisect import bisect_left
+# Imports go here.
+
+
+_ID_SEGMENT = re.compile(
+    r"^(\d+|[0-9a-f]{8}(-[0-9a-f]{4}){3}-[0-9a-f]{12})$", re.IGNORECASE
+)
+
+
+def endpoint_template(address):
+    path = address.split("?", 1)[0].strip("/")
+    return "/".join(
+        "{id}" if _ID_SEGMENT.match(segment) else segment
+        for segment in path.split("/")
+    )
+# Turns a address such as "droplets/123/actions?page=2" into the endpoint
+# template "droplets/{id}/actions", so metrics aren't split per ID.
+
+
+class Histogram:
+    __slots__ = ["bounds", "counts", "count", "sum"]
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+    # Records a value in the first bucket it fits under.
+
+    def cumulative(self):
+        total = 0
+        result = []
+        for bound, count in zip(self.bounds + (float("inf"),), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+    # Gets the bucket counts the way Prometheus wants them, each one
+    # holding everything at or under its bound.
+# A fixed-bucket histogram.
+
+
+def _format_bound(bound):
+    if bound == float("inf"):
+        return "+Inf"
+    return repr(float(bound))
+
+
+def _labels(**labels):
+    return ",".join(
+        f'{k}="{str(v)}"' for k, v in labels.items()
+    )
+
+
+class Metrics:
+    LATENCY_BUCKETS = (
+        0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+    )
+    SIZE_BUCKETS = (
+        256, 1024, 4096, 16384, 65536, 262144, 1048576
+    )
+    # The latency buckets in seconds and the response size buckets in bytes.
+
+    def __init__(self, callback=None, prefix="digitalocean"):
+        self.callback = callback
+        self.prefix = prefix
+        self.in_flight = 0
+        self.rate_limit = None
+        self.rate_limit_remaining = None
+        self.requests = {}
+        self.errors = {}
+        self.retries = {}
+        self.latency = {}
+        self.sizes = {}
+    # Initialises empty metrics. The callback, if given, is called with
+    # every finished attempt as (method, endpoint, status, seconds, size),
+    # where status is None if the request failed without a response.
+
+    def started(self):
+        self.in_flight += 1
+
+    def finished(self):
+        self.in_flight -= 1
+    # Tracks how many requests are out on the wire.
+
+    def observe(self, method, address, status, seconds, size):
+        endpoint = endpoint_template(address)
+        key = (method, endpoint)
+        if status is None:
+            self.errors[key] = self.errors.get(key, 0) + 1
+        else:
+            counted = (method, endpoint, status)
+            self.requests[counted] = self.requests.get(counted, 0) + 1
+
+        latency = self.latency.get(key)
+        if latency is None:
+            latency = self.latency[key] = Histogram(self.LATENCY_BUCKETS)
+        latency.observe(seconds)
+
+        if size is not None:
+            sizes = self.sizes.get(key)
+            if sizes is None:
+                sizes = self.sizes[key] = Histogram(self.SIZE_BUCKETS)
+            sizes.observe(size)
+
+        if self.callback is not None:
+            self.callback(method, endpoint, status, seconds, size)
+    # Records one attempt at a request.
+
+    def retried(self, method, address):
+        key = (method, endpoint_template(address))
+        self.retries[key] = self.retries.get(key, 0) + 1
+    # Records a attempt being tried again.
+
+    def update_rate_limit(self, limit, remaining):
+        self.rate_limit = limit
+        self.rate_limit_remaining = remaining
+    # Records the rate limit headroom the API last told us about.
+
+    def _histogram_lines(self, name, histograms):
+        lines = [f"# TYPE {name} histogram"]
+        for (method, endpoint), h in sorted(histograms.items()):
+            labels = _labels(method=method, endpoint=endpoint)
+            for bound, total in h.cumulative():
+                lines.append(
+                    f'{name}_bucket{{{labels},le="{_format_bound(bound)}"}}'
+                    f" {total}"
+                )
+            lines.append(f"{name}_sum{{{labels}}} {h.sum}")
+            lines.append(f"{name}_count{{{labels}}} {h.count}")
+        return lines
+    # Renders a family of histograms.
+
+    def render(self):
+        p = self.prefix
+        lines = [f"# TYPE {p}_requests_total counter"]
+        for (method, endpoint, status), n in sorted(self.requests.items()):
+            labels = _labels(method=method, endpoint=endpoint, status=status)
+            lines.append(f"{p}_requests_total{{{labels}}} {n}")
+
+        for name, counts in (
+            ("request_errors_total", self.errors),
+            ("retries_total", self.retries)
+        ):
+            lines.append(f"# TYPE {p}_{name} counter")
+            for (method, endpoint), n in sorted(counts.items()):
+                lines.append(
+                    f"{p}_{name}"
+                    f"{{{_labels(method=method, endpoint=endpoint)}}} {n}"
+                )
+
+        lines += self._histogram_lines(
+            f"{p}_request_duration_seconds", self.latency
+        )
+        lines += self._histogram_lines(
+            f"{p}_response_size_bytes", self.sizes
+        )
+
+        lines.append(f"# TYPE {p}_requests_in_flight gauge")
+        lines.append(f"{p}_requests_in_flight {self.in_flight}")
+        for name, value in (
+            ("rate_limit", self.rate_limit),
+            ("rate_limit_remaining", self.rate_limit_remaining)
+        ):
+            if value is not None:
+                lines.append(f"# TYPE {p}_{name} gauge")
+                lines.append(f"{p}_{name} {value}")
+        return "\n".join(lines) + "\n"
+    # Renders everything in the Prometheus text format.
+# Counters, histograms and gauges about the requests a client makes.
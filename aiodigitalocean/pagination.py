@@ -0,0 +1,249 @@
+"""
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+import asyncio
+import math
+from urllib.parse import urlencode
+from .exceptions import Forbidden, HTTPException
+# Imports go here.
+
+API_BASE = "https://api.digitalocean.com/v2/"
+MAX_PER_PAGE = 200
+# The API base and the largest page size the API allows.
+
+
+def build_address(path, params=None):
+    if not params:
+        return path
+
+    params = {
+        k: v for k, v in params.items() if v is not None
+    }
+    if not params:
+        return path
+
+    return f"{path}?{urlencode(params)}"
+# Builds a relative API address with a query string.
+
+
+def clamp_per_page(per_page):
+    if per_page is None:
+        return None
+
+    return max(1, min(int(per_page), MAX_PER_PAGE))
+# Keeps the page size within what the API accepts.
+
+
+def _relative(url):
+    if url.startswith(API_BASE):
+        return url[len(API_BASE):]
+
+    return url
+# Turns a absolute "links.pages" URL into a v2_request address.
+
+
+def _next_address(_json):
+    links = _json.get('links') or {}
+    pages = links.get('pages') or {}
+    next_url = pages.get('next')
+    if next_url:
+        return _relative(next_url)
+# Gets the address of the next page, if there is one.
+
+
+def _discard(task):
+    if task is None:
+        return
+
+    if not task.done():
+        task.cancel()
+    elif not task.cancelled():
+        task.exception()
+# Cancels a prefetch nobody is going to read.
+
+
+async def get_page(client, address):
+    response = await client.v2_request("GET", address)
+    _json = None
+    if isinstance(response, tuple):
+        response, _json = response
+
+    if response.status == 403:
+        raise Forbidden(
+            "Credentials invalid."
+        )
+    elif response.status == 404:
+        return
+    elif response.status != 200:
+        raise HTTPException(
+            f"Returned the status {response.status}."
+        )
+
+    return _json
+# Gets a single page of a listing. Returns None on a 404.
+
+
+async def paginate(client, path, key, per_page=None, params=None):
+    params = dict(params or {})
+    params['per_page'] = clamp_per_page(per_page)
+    pending = asyncio.ensure_future(
+        get_page(client, build_address(path, params))
+    )
+
+    try:
+        while pending is not None:
+            _json = await pending
+            pending = None
+            if _json is None:
+                return
+
+            address = _next_address(_json)
+            if address:
+                # Fetch the next page whilst the caller eats this one.
+                pending = asyncio.ensure_future(
+                    get_page(client, address)
+                )
+
+            for item in _json[key]:
+                yield item
+    finally:
+        _discard(pending)
+# Lazily walks every page of a listing, prefetching one page ahead.
+# Stops fetching as soon as the caller stops iterating.
+
+
+def _item_id(item):
+    return item.get('id', item.get('slug'))
+# Gets what identifies a listed item, falling back to the slug for things
+# like regions and sizes which have no ID.
+
+
+async def fetch_all_pages(
+    client, path, key, per_page=MAX_PER_PAGE,
+    params=None, concurrency=8, item_key=_item_id
+):
+    params = dict(params or {})
+    params['per_page'] = clamp_per_page(per_page) or MAX_PER_PAGE
+    first = await get_page(client, build_address(path, params))
+    if first is None:
+        return []
+
+    items = list(first[key])
+    meta = first.get('meta') or {}
+    total = meta.get('total') or len(items)
+    pages = math.ceil(total / params['per_page'])
+    if pages <= 1:
+        return items
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def fetch(page):
+        async with semaphore:
+            _json = await get_page(
+                client, build_address(path, dict(params, page=page))
+            )
+        if _json is None:
+            return []
+        return _json[key]
+
+    tasks = [
+        asyncio.ensure_future(fetch(page))
+        for page in range(2, pages + 1)
+    ]
+    try:
+        for page_items in await asyncio.gather(*tasks):
+            items.extend(page_items)
+    finally:
+        for task in tasks:
+            _discard(task)
+
+    # Items can shift between pages whilst we read them, so drop repeats.
+    seen = set()
+    unique = []
+    for item in items:
+        identity = item_key(item)
+        if identity not in seen:
+            seen.add(identity)
+            unique.append(item)
+    return unique
+# Reads the first page for meta.total, then fetches every other page at
+# once with at most "concurrency" requests in flight. Keeps page order.
+# Repeats are spotted with item_key.
+
+
+async def _get_by_id(client, path, single_key, _id, semaphore):
+    async with semaphore:
+        try:
+            _json = await get_page(client, f"{path}/{_id}")
+        except Exception as e:
+            return _id, e
+
+    if _json is None:
+        return _id, None
+    return _id, _json[single_key]
+# Gets a single item by ID, handing back any error instead of raising it.
+
+
+async def fetch_by_ids(
+    client, ids, path, single_key, concurrency=10
+):
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        return
+
+    use_listing = False
+    if len(ids) > 2:
+        # One tiny page tells us how many requests the full listing costs.
+        try:
+            probe = await get_page(
+                client, build_address(path, {"per_page": 1})
+            )
+        except Exception:
+            probe = None
+        total = ((probe or {}).get('meta') or {}).get('total') or 0
+        use_listing = math.ceil(total / MAX_PER_PAGE) < len(ids)
+
+    if use_listing:
+        try:
+            items = await fetch_all_pages(
+                client, path, path, concurrency=concurrency
+            )
+        except Exception as e:
+            for _id in ids:
+                yield _id, e
+            return
+
+        by_id = {i['id']: i for i in items}
+        for _id in ids:
+            yield _id, by_id.get(_id)
+        return
+
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    tasks = [
+        asyncio.ensure_future(
+            _get_by_id(client, path, single_key, _id, semaphore)
+        ) for _id in ids
+    ]
+    try:
+        for task in asyncio.as_completed(tasks):
+            yield await task
+    finally:
+        for task in tasks:
+            _discard(task)
+# Gets many items by ID, yielding (id, JSON) pairs as they arrive. The JSON
+# is None if the item doesn't exist, or the exception if getting it failed.
+# Reads the whole listing when that costs fewer requests than GETs by ID.
@@ -0,0 +1,290 @@
+"""
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+import abc
+import asyncio
+import math
+from .abc import Droplet, Action
+from .exceptions import Forbidden, WaitTimeout, HTTPException,\
+    CannotCreateDroplet, ClientClosed
+from .pagination import fetch_by_ids, get_page, paginate,\
+    MAX_PER_PAGE
+# Imports go here.
+
+
+class BatchPoller(abc.ABC):
+    def __init__(
+        self, client, min_interval=1, max_interval=10,
+        backoff=1.5, max_errors=5
+    ):
+        self.client = client
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.max_errors = max_errors
+        self._waiters = {}
+        self._task = None
+        self._wake = None
+        self._interval = min_interval
+    # Initialises the poller.
+
+    @property
+    def pending(self):
+        return len(self._waiters)
+    # Gets how many ids are being waited on.
+
+    @abc.abstractmethod
+    async def _fetch(self, ids):
+        pass
+    # Gets the latest JSON for as many of the ids as possible, keyed by id.
+    # A id mapped to None is known to no longer exist.
+
+    @abc.abstractmethod
+    def _done(self, _json):
+        pass
+    # Checks if the JSON is in its finished state.
+
+    def _gone(self, _id):
+        return HTTPException(f"{_id} no longer exists.")
+    # Builds the error given to waiters on a id which no longer exists.
+
+    def _result(self, _json):
+        return _json
+    # Turns the finished JSON into what the waiters get back.
+
+    def _resolve(self, _id, result=None, error=None):
+        for future in self._waiters.pop(_id, []):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+    # Hands a result (or error) to everything waiting on a id.
+
+    def _prune(self):
+        for _id in list(self._waiters):
+            futures = [
+                f for f in self._waiters[_id] if not f.done()
+            ]
+            if futures:
+                self._waiters[_id] = futures
+            else:
+                del self._waiters[_id]
+    # Forgets waiters which timed out or were cancelled.
+
+    async def _sleep(self):
+        try:
+            await asyncio.wait_for(self._wake.wait(), self._interval)
+        except asyncio.TimeoutError:
+            return False
+
+        self._wake.clear()
+        return True
+    # Sleeps for the interval. Returns True if a new waiter cut it short.
+
+    def _slow_down(self):
+        self._interval = min(
+            self._interval * self.backoff, self.max_interval
+        )
+    # Backs the poll interval off.
+
+    async def _run(self):
+        self._interval = self.min_interval
+        errors = 0
+        try:
+            while True:
+                if await self._sleep():
+                    # Somebody new is waiting, so go back to polling quickly.
+                    self._interval = self.min_interval
+                    continue
+
+                self._prune()
+                if not self._waiters:
+                    return
+
+                try:
+                    found = await self._fetch(list(self._waiters))
+                except Forbidden as e:
+                    for _id in list(self._waiters):
+                        self._resolve(_id, error=e)
+                    return
+                except Exception as e:
+                    errors += 1
+                    if errors >= self.max_errors:
+                        for _id in list(self._waiters):
+                            self._resolve(_id, error=e)
+                        return
+                    self._slow_down()
+                    continue
+
+                errors = 0
+                finished = 0
+                for _id, _json in found.items():
+                    if _id not in self._waiters:
+                        continue
+                    elif _json is None:
+                        self._resolve(_id, error=self._gone(_id))
+                        finished += 1
+                    elif self._done(_json):
+                        self._resolve(_id, self._result(_json))
+                        finished += 1
+
+                # Poll quickly whilst things are finishing, back off when not.
+                if finished:
+                    self._interval = self.min_interval
+                else:
+                    self._slow_down()
+        finally:
+            self._task = None
+    # The shared poll loop. Runs whilst anything is being waited on.
+
+    async def wait(self, _id, timeout=None):
+        future = asyncio.get_event_loop().create_future()
+        self._waiters.setdefault(_id, []).append(future)
+
+        if self._wake is None:
+            self._wake = asyncio.Event()
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+        elif self._interval > self.min_interval:
+            self._wake.set()
+
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            raise WaitTimeout(
+                f"{_id} did not finish within {timeout} seconds."
+            )
+    # Waits for a id to finish, raising WaitTimeout past the deadline.
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for _id in list(self._waiters):
+            self._resolve(_id, error=ClientClosed(
+                "The client was closed."
+            ))
+    # Stops polling and fails everything still being waited on.
+# A client-wide poller which refreshes everything being waited on at once.
+
+
+class DropletPoller(BatchPoller):
+    async def _fetch(self, ids):
+        found = {}
+        errors = []
+        async for _id, _json in fetch_by_ids(
+            self.client, ids, "droplets", "droplet"
+        ):
+            if isinstance(_json, BaseException):
+                errors.append(_json)
+            else:
+                found[_id] = _json
+
+        for e in errors:
+            if isinstance(e, Forbidden):
+                raise e
+        if errors and not found:
+            raise errors[0]
+        return found
+    # Gets every pending droplet by ID, or with one listing when that costs
+    # fewer requests. Droplets which failed to come back are tried again on
+    # the next tick.
+
+    def _done(self, _json):
+        return _json['status'] == "active"
+    # Checks if the droplet is active.
+
+    def _gone(self, _id):
+        return CannotCreateDroplet(
+            f"The droplet {_id} disappeared before becoming active."
+        )
+    # Builds the error for a droplet which failed or was deleted.
+
+    def _result(self, _json):
+        self.client._track_droplet(_json)
+        return Droplet(self.client, _json)
+    # Turns the droplet JSON into a droplet.
+# Waits for new droplets to become active.
+
+
+class ActionPoller(BatchPoller):
+    def __init__(self, client, **kwargs):
+        super().__init__(client, **kwargs)
+        self._list_cost = 1
+    # Initialises the poller.
+
+    async def _fetch_one(self, _id):
+        _json = await get_page(self.client, f"actions/{_id}")
+        if _json is not None:
+            return _json['action']
+    # Gets a single action by ID.
+
+    async def _fetch(self, ids):
+        if len(ids) < self._list_cost:
+            actions = await asyncio.gather(
+                *[self._fetch_one(i) for i in ids]
+            )
+            return dict(zip(ids, actions))
+
+        # The listing is newest first, so pending actions are near the top.
+        # Never read more pages than GETs by ID would have cost.
+        missing = set(ids)
+        found = {}
+        seen = 0
+        limit = len(ids) * MAX_PER_PAGE
+        actions = paginate(
+            self.client, "actions", "actions", MAX_PER_PAGE
+        )
+        try:
+            async for a in actions:
+                seen += 1
+                if a['id'] in missing:
+                    missing.discard(a['id'])
+                    found[a['id']] = a
+                    if not missing:
+                        break
+                if seen >= limit:
+                    break
+        finally:
+            await actions.aclose()
+
+        if missing:
+            missing = list(missing)
+            found.update(zip(missing, await asyncio.gather(
+                *[self._fetch_one(i) for i in missing]
+            )))
+
+        # Count the fallback GETs too, so a action the scan can't reach
+        # switches the next tick over to GETs by ID.
+        self._list_cost = max(
+            1, math.ceil(seen / MAX_PER_PAGE) + len(missing)
+        )
+        return found
+    # Gets every pending action from the top of the listing, falling back
+    # to GETs by ID for any it didn't reach, or by ID when that costs fewer
+    # requests.
+
+    def _done(self, _json):
+        return _json['status'] in ("completed", "errored")
+    # Checks if the action has finished.
+
+    def _result(self, _json):
+        return Action(self.client, _json)
+    # Turns the action JSON into a action.
+# Waits for droplet actions to finish.
@@ -0,0 +1,210 @@
+"""
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+import abc
+from datetime import timezone
+# Imports go here.
+
+
+def slug_of(value):
+    return getattr(value, "slug", value)
+# Gets the slug of a region, size or image, or the value if it's a slug.
+
+
+class Operator(abc.ABC):
+    __slots__ = []
+
+    @abc.abstractmethod
+    def check(self, normalise):
+        pass
+    # Builds a function checking a field value against the operator.
+# The base for the query operators which can be given to a model.
+
+
+class In(Operator):
+    __slots__ = ["values"]
+
+    def __init__(self, *values):
+        self.values = values
+
+    def check(self, normalise):
+        values = frozenset(normalise(v) for v in self.values)
+        return lambda v: v in values
+# Matches when the field is any of the values.
+
+
+class Range(Operator):
+    __slots__ = ["min", "max"]
+
+    def __init__(self, min=None, max=None):
+        self.min = min
+        self.max = max
+
+    def check(self, normalise):
+        low, high = self.min, self.max
+        if low is not None:
+            low = normalise(low)
+        if high is not None:
+            high = normalise(high)
+
+        if low is None and high is None:
+            return lambda v: True
+        elif low is None:
+            return lambda v: v <= high
+        elif high is None:
+            return lambda v: low <= v
+        return lambda v: low <= v <= high
+# Matches when the field is between min and max, inclusive. Either (or
+# both) can be left out.
+
+
+class Prefix(Operator):
+    __slots__ = ["prefix"]
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+
+    def check(self, normalise):
+        prefix = self.prefix
+        return lambda v: v is not None and v.startswith(prefix)
+# Matches when the field starts with the prefix.
+
+
+class AnyOf(Operator):
+    __slots__ = ["values"]
+
+    def __init__(self, *values):
+        self.values = values
+
+    def check(self, normalise):
+        values = frozenset(normalise(v) for v in self.values)
+        return lambda v: not values.isdisjoint(v)
+# Matches when a list field (such as tags) holds any of the values.
+
+
+class AllOf(Operator):
+    __slots__ = ["values"]
+
+    def __init__(self, *values):
+        self.values = values
+
+    def check(self, normalise):
+        values = frozenset(normalise(v) for v in self.values)
+        return lambda v: values.issubset(v)
+# Matches when a list field (such as tags) holds every one of the values.
+
+
+AnyTag = AnyOf
+AllTags = AllOf
+# Friendlier names for matching tags.
+
+
+def _identity(value):
+    return value
+
+
+def _utc(value):
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+# Treats a naive datetime as UTC so it compares with the API's times.
+
+
+def compile_predicate(criteria, fields):
+    checks = []
+    for key, value in criteria.items():
+        getter, normalise, contains = fields[key]
+        if isinstance(value, In) and contains:
+            # On a list field, In means any of the values.
+            test = AnyOf(*value.values).check(normalise)
+        elif isinstance(value, Operator):
+            test = value.check(normalise)
+        elif contains:
+            test = (lambda wanted: lambda v: wanted in v)(value)
+        else:
+            test = (lambda wanted: lambda v: v == wanted)(normalise(value))
+        checks.append((getter, test))
+
+    if not checks:
+        return lambda obj: True
+
+    def predicate(obj):
+        for getter, test in checks:
+            if not test(getter(obj)):
+                return False
+        return True
+    return predicate
+# Compiles the criteria into one function. Fields maps each key to a getter
+# for the object, a function normalising given values (e.g. a Region to
+# its slug) and whether a plain value means membership rather than
+# equality.
+
+
+DROPLET_FIELDS = {
+    "id": (lambda d: d.id, _identity, False),
+    "name": (lambda d: d.name, _identity, False),
+    "size": (lambda d: d.size_slug, slug_of, False),
+    "locked": (lambda d: d.locked, _identity, False),
+    "status": (lambda d: d.status, _identity, False),
+    "tags": (lambda d: d.tags, _identity, True),
+    "region": (lambda d: d.region.slug, slug_of, False),
+    "image": (lambda d: d.image.slug, slug_of, False),
+    "memory": (lambda d: d.memory, _identity, False),
+    "vcpus": (lambda d: d.vcpus, _identity, False),
+    "disk": (lambda d: d.disk, _identity, False),
+    "created_at": (lambda d: d.created_at, _utc, False)
+}
+# How each droplet model criteria is read from a droplet.
+
+
+LOAD_BALANCER_FIELDS = {
+    "id": (lambda b: b.id, _identity, False),
+    "name": (lambda b: b.name, _identity, False),
+    "ip": (lambda b: b.ip, _identity, False),
+    "status": (lambda b: b.status, _identity, False),
+    "algorithm": (lambda b: b.algorithm, _identity, False),
+    "tag": (lambda b: b.tag, _identity, False),
+    "region": (lambda b: b.region.slug, slug_of, False),
+    "redirect_http_to_https": (
+        lambda b: b.redirect_http_to_https, _identity, False
+    ),
+    "forwarding_rules": (lambda b: b.forwarding_rules, _identity, True),
+    "droplet_ids": (
+        lambda b: b.droplet_ids, _identity, False
+    )
+}
+# How each load balancer model criteria is read from a load balancer.
+
+
+def droplet_api_filters(criteria):
+    tags = criteria.get("tags")
+    if isinstance(tags, AllOf) and tags.values:
+        # The API narrows it to one tag, we check the rest.
+        return {"tag_name": tags.values[0]}
+    elif isinstance(tags, AnyOf) and len(tags.values) == 1:
+        return {"tag_name": tags.values[0]}
+    elif tags is not None and not isinstance(tags, Operator):
+        return {"tag_name": tags}
+
+    # The API can only filter by one of tag_name and name at a time.
+    name = criteria.get("name")
+    if name is not None and not isinstance(name, Operator):
+        return {"name": name}
+
+    return {}
+# Works out which droplet criteria the API can filter by. Everything is
+# still checked on our side, so these only cut down what is sent back.
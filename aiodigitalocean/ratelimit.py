@@ -0,0 +1,147 @@
+"""
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+import asyncio
+import time
+# Imports go here.
+
+
+class RateLimiter:
+    def __init__(self, window=3600, burst=10, reserve=0.1):
+        self.window = window
+        self.burst = burst
+        self.reserve = reserve
+        self.limit = None
+        self.remaining = None
+        self.reset = None
+        self.rate = None
+        self._tokens = None
+        self._updated = time.monotonic()
+        self._lock = None
+    # Initialises the limiter. Nothing is paced until the API has told us
+    # the budget through the RateLimit-* headers. Requests go out freely
+    # until only the reserve (a fraction of the limit) is left, then they
+    # are paced with at most burst going out back to back.
+
+    @property
+    def budget(self):
+        if self._tokens is None:
+            return None
+
+        self._refill(time.monotonic())
+        return int(self._tokens)
+    # Gets the number of requests that can go out right now without waiting.
+
+    def _capacity(self):
+        if self.remaining is None:
+            return float(self.burst)
+
+        reserve = int((self.limit or 0) * self.reserve)
+        return float(max(
+            min(self.burst, self.remaining), self.remaining - reserve
+        ))
+    # Gets how many tokens the bucket can hold. Everything above the
+    # reserve can be spent at once.
+
+    def _set_rate(self):
+        if self.remaining is not None and self.reset is not None:
+            left = self.reset - time.time()
+            if left > 0:
+                # Spread what is left evenly until the reset.
+                self.rate = self.remaining / left
+                return
+
+        self.rate = self.limit / self.window if self.limit else None
+    # Works out how many requests a second can go out.
+
+    def _refill(self, now):
+        if self._tokens is not None and self.rate:
+            self._tokens = min(
+                self._capacity(),
+                self._tokens + (now - self._updated) * self.rate
+            )
+        self._updated = now
+    # Tops up the bucket at the paced rate.
+
+    def update(self, headers, status=None):
+        try:
+            limit = int(headers['RateLimit-Limit'])
+            remaining = int(headers['RateLimit-Remaining'])
+            reset = float(headers['RateLimit-Reset'])
+        except (KeyError, TypeError, ValueError):
+            if status == 429 and self._tokens is not None:
+                self._tokens = 0.0
+            return
+
+        self._refill(time.monotonic())
+        self.limit = limit
+        self.remaining = remaining
+        self.reset = reset
+        self._set_rate()
+        if self._tokens is None:
+            self._tokens = self._capacity()
+        else:
+            # Requests still in flight were already taken from the bucket,
+            # so only ever move down to what the API says can be spent.
+            self._tokens = min(self._tokens, self._capacity())
+
+        if status == 429:
+            self._tokens = 0.0
+    # Learns the budget from the RateLimit-* headers of a response.
+
+    def _wait_time(self):
+        wait = float("inf")
+        if self.rate:
+            wait = (1 - self._tokens) / self.rate
+        if self.reset is not None:
+            # The API frees up requests at the reset time, so never wait
+            # past it.
+            until_reset = self.reset - time.time()
+            if until_reset > 0:
+                wait = min(wait, until_reset)
+        if wait == float("inf"):
+            wait = 1.0
+        return max(wait, 0.01)
+    # Gets how long to wait until the next token is free.
+
+    async def acquire(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            while True:
+                if self._tokens is None:
+                    return
+
+                self._refill(time.monotonic())
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    if self.remaining:
+                        self.remaining -= 1
+                    return
+
+                await asyncio.sleep(self._wait_time())
+                if self.reset is not None and time.time() >= self.reset:
+                    # The window rolls, so the oldest request leaving it
+                    # frees up one more. The next response says the rest.
+                    self.remaining = (self.remaining or 0) + 1
+                    self.reset = None
+                    self._set_rate()
+                    self._tokens = max(self._tokens, 1.0)
+    # Waits until a request can be made without going over the budget.
+# A client-wide token bucket that paces requests by the RateLimit-* headers
+# once the budget runs low, so what's left lasts until the reset time.
@@ -0,0 +1,96 @@
+"""
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+# Imports go here.
+
+
+class RetryPolicy:
+    def __init__(
+        self, max_attempts=4,
+        methods=("GET", "PUT", "DELETE", "HEAD", "OPTIONS"),
+        statuses=(429, 500, 502, 503, 504),
+        backoff=0.5, max_backoff=30, total_timeout=60,
+        respect_retry_after=True
+    ):
+        self.max_attempts = max_attempts
+        self.methods = frozenset(m.upper() for m in methods)
+        self.statuses = frozenset(statuses)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.total_timeout = total_timeout
+        self.respect_retry_after = respect_retry_after
+    # Initialises the policy. POST is left out of the methods by default
+    # since creating things twice is worse than failing once.
+
+    def allows(self, method, attempt, status=None):
+        if attempt >= self.max_attempts:
+            return False
+        elif method.upper() not in self.methods:
+            return False
+        elif status is not None and status not in self.statuses:
+            return False
+
+        return True
+    # Checks if a attempt that failed with the status (or a connection
+    # error when the status is None) can be tried again.
+
+    @staticmethod
+    def parse_retry_after(value):
+        if not value:
+            return
+
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return
+
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        return max(
+            0.0, (when - datetime.now(timezone.utc)).total_seconds()
+        )
+    # Parses a Retry-After header in either seconds or HTTP date form.
+
+    def delay(self, attempt, started, retry_after=None):
+        wait = None
+        if self.respect_retry_after:
+            wait = self.parse_retry_after(retry_after)
+
+        if wait is None:
+            # Exponential backoff with full jitter.
+            wait = random.uniform(
+                0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+            )
+
+        if self.total_timeout is not None:
+            left = self.total_timeout - (time.monotonic() - started)
+            if wait > left:
+                return
+
+        return wait
+    # Gets how long to sleep before the next attempt, or None if that would
+    # go over the total time budget.
+# A policy deciding which failed requests get retried and when.
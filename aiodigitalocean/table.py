@@ -0,0 +1,325 @@
+"""
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+from array import array
+from .abc import Droplet, parse_timestamp
+from .pagination import fetch_all_pages, fetch_by_ids
+try:
+    import numpy
+except ImportError:
+    numpy = None
+# Imports go here.
+
+
+class DropletTable:
+    NUMERIC = {
+        "id": "q", "memory": "q", "vcpus": "q",
+        "disk": "q", "created_at": "d"
+    }
+    CODED = ("status", "region", "size")
+    # The packed columns and their array type codes. Coded columns hold a
+    # index into a list of the distinct strings.
+
+    def __init__(self, client=None, keep_raw=False):
+        self.client = client
+        self.keep_raw = keep_raw
+        self._columns = {
+            name: array(code) for name, code in self.NUMERIC.items()
+        }
+        for name in self.CODED:
+            self._columns[name] = array("l")
+        self._columns['tag_rows'] = array("q")
+        self._columns['tag_codes'] = array("l")
+        self._values = {name: [] for name in self.CODED + ("tag",)}
+        self._codes = {name: {} for name in self.CODED + ("tag",)}
+        self._raw = [] if keep_raw else None
+        self._length = 0
+        self._arrays = {}
+    # Initialises a empty table. Only the packed columns are kept unless
+    # keep_raw is set, in which case each droplet's JSON is kept too so
+    # droplets() needs no requests.
+
+    def __len__(self):
+        return self._length
+
+    def _code(self, name, value):
+        codes = self._codes[name]
+        code = codes.get(value)
+        if code is None:
+            code = len(self._values[name])
+            codes[value] = code
+            self._values[name].append(value)
+        return code
+    # Gets the code for a string, adding it to the column's strings if new.
+
+    def append(self, droplet_json):
+        c = self._columns
+        row = self._length
+        c['id'].append(droplet_json['id'])
+        c['memory'].append(droplet_json['memory'])
+        c['vcpus'].append(droplet_json['vcpus'])
+        c['disk'].append(droplet_json['disk'])
+        c['created_at'].append(
+            parse_timestamp(droplet_json['created_at']).timestamp()
+        )
+        c['status'].append(self._code("status", droplet_json['status']))
+        c['region'].append(self._code(
+            "region", (droplet_json.get('region') or {}).get('slug')
+        ))
+        c['size'].append(self._code("size", droplet_json['size_slug']))
+        for tag in droplet_json['tags']:
+            c['tag_rows'].append(row)
+            c['tag_codes'].append(self._code("tag", tag))
+
+        if self._raw is not None:
+            self._raw.append(droplet_json)
+        self._length += 1
+        self._arrays.clear()
+    # Adds a droplet's JSON as a new row.
+
+    @classmethod
+    async def from_client(
+        cls, client, tag_name=None, keep_raw=False,
+        per_page=200, concurrency=8
+    ):
+        table = cls(client, keep_raw)
+        for d in await fetch_all_pages(
+            client, "droplets", "droplets", per_page,
+            {"tag_name": tag_name}, concurrency
+        ):
+            table.append(d)
+        return table
+    # Builds a table straight from the droplets listing.
+
+    def column(self, name):
+        col = self._columns[name]
+        if numpy is None:
+            return col
+
+        converted = self._arrays.get(name)
+        if converted is None:
+            # Copied so the array module can still grow the column.
+            converted = numpy.array(col, dtype=col.typecode)
+            self._arrays[name] = converted
+        return converted
+    # Gets a packed column, as a NumPy array if NumPy is installed.
+
+    def values(self, name):
+        if name in self.NUMERIC:
+            return list(self._columns[name])
+
+        strings = self._values[name]
+        return [strings[code] for code in self._columns[name]]
+    # Gets a column as a plain list, with coded columns turned back into
+    # their strings.
+
+    def _equals(self, name, value):
+        code = self._codes[name].get(value, -1)
+        col = self.column(name)
+        if numpy is not None:
+            return col == code
+        return [c == code for c in col]
+    # Builds a mask of rows where a coded column equals the value.
+
+    def _compare(self, name, low, high):
+        col = self.column(name)
+        if numpy is not None:
+            mask = numpy.ones(self._length, dtype=bool)
+            if low is not None:
+                mask &= col >= low
+            if high is not None:
+                mask &= col <= high
+            return mask
+
+        return [
+            (low is None or v >= low) and (high is None or v <= high)
+            for v in col
+        ]
+    # Builds a mask of rows where a numeric column is within the bounds.
+
+    def _tagged(self, tag):
+        code = self._codes['tag'].get(tag, -1)
+        if numpy is not None:
+            mask = numpy.zeros(self._length, dtype=bool)
+            rows = self.column("tag_rows")[self.column("tag_codes") == code]
+            mask[rows] = True
+            return mask
+
+        mask = [False] * self._length
+        for row, c in zip(
+            self._columns['tag_rows'], self._columns['tag_codes']
+        ):
+            if c == code:
+                mask[row] = True
+        return mask
+    # Builds a mask of rows which have the tag.
+
+    @staticmethod
+    def _and(a, b):
+        if numpy is not None:
+            return a & b
+        return [x and y for x, y in zip(a, b)]
+    # Combines two masks.
+
+    def where(
+        self, status=None, region=None, size=None, tag=None,
+        min_memory=None, max_memory=None, min_vcpus=None,
+        max_vcpus=None, min_disk=None, max_disk=None,
+        created_after=None, created_before=None
+    ):
+        if numpy is not None:
+            mask = numpy.ones(self._length, dtype=bool)
+        else:
+            mask = [True] * self._length
+
+        for name, value in (
+            ("status", status), ("region", region), ("size", size)
+        ):
+            if value is not None:
+                mask = self._and(mask, self._equals(name, value))
+
+        if tag is not None:
+            mask = self._and(mask, self._tagged(tag))
+
+        for name, low, high in (
+            ("memory", min_memory, max_memory),
+            ("vcpus", min_vcpus, max_vcpus),
+            ("disk", min_disk, max_disk),
+            ("created_at", created_after, created_before)
+        ):
+            if low is not None or high is not None:
+                if name == "created_at":
+                    low = low.timestamp() if low is not None else None
+                    high = high.timestamp() if high is not None else None
+                mask = self._and(mask, self._compare(name, low, high))
+
+        return mask
+    # Builds a mask of the rows matching every criteria given. Times are
+    # datetimes, everything else is compared as is.
+
+    def rows(self, mask):
+        if numpy is not None:
+            return [int(i) for i in numpy.flatnonzero(mask)]
+        return [i for i, m in enumerate(mask) if m]
+    # Turns a mask into a list of row numbers.
+
+    def filter(self, mask):
+        table = DropletTable(self.client, self.keep_raw)
+        rows = self.rows(mask)
+        c = self._columns
+        tags = {}
+        for row, code in zip(c['tag_rows'], c['tag_codes']):
+            tags.setdefault(row, []).append(code)
+
+        for new_row, row in enumerate(rows):
+            for name in self.NUMERIC:
+                table._columns[name].append(c[name][row])
+            for name in self.CODED:
+                table._columns[name].append(table._code(
+                    name, self._values[name][c[name][row]]
+                ))
+            for code in tags.get(row, ()):
+                table._columns['tag_rows'].append(new_row)
+                table._columns['tag_codes'].append(table._code(
+                    "tag", self._values['tag'][code]
+                ))
+            if self._raw is not None:
+                table._raw.append(self._raw[row])
+            table._length += 1
+        table._arrays.clear()
+        return table
+    # Builds a new table holding only the rows in the mask.
+
+    def group_by(self, name, value=None, agg="count"):
+        if name == "tag":
+            keys = self._values['tag']
+            groups = self.column("tag_codes")
+            rows = self.column("tag_rows")
+        elif name in self.CODED:
+            keys = self._values[name]
+            groups = self.column(name)
+            rows = None
+        else:
+            keys = None
+            groups = self.column(name)
+            rows = None
+
+        weights = None
+        if agg != "count":
+            weights = self.column(value)
+            if rows is not None:
+                weights = [weights[r] for r in rows]\
+                    if numpy is None else weights[rows]
+
+        if numpy is not None and keys is not None:
+            size = len(keys)
+            counts = numpy.bincount(groups, minlength=size)
+            sums = numpy.bincount(
+                groups, weights=weights, minlength=size
+            ) if weights is not None else counts
+            result = {}
+            for code, key in enumerate(keys):
+                if not counts[code]:
+                    continue
+                if agg == "count":
+                    result[key] = int(counts[code])
+                elif agg == "sum":
+                    result[key] = sums[code].item()
+                else:
+                    result[key] = (sums[code] / counts[code]).item()
+            return result
+
+        if numpy is not None:
+            groups = groups.tolist()
+            if weights is not None:
+                weights = weights.tolist()
+
+        counts = {}
+        sums = {}
+        for i, g in enumerate(groups):
+            key = keys[g] if keys is not None else g
+            counts[key] = counts.get(key, 0) + 1
+            if weights is not None:
+                sums[key] = sums.get(key, 0) + weights[i]
+
+        if agg == "count":
+            return counts
+        elif agg == "sum":
+            return sums
+        return {k: sums[k] / counts[k] for k in counts}
+    # Groups rows by a column and counts them, or sums or averages another
+    # column with agg="sum" or agg="mean".
+
+    async def droplets(self, mask=None):
+        rows = range(self._length) if mask is None else self.rows(mask)
+        if self._raw is not None:
+            for row in rows:
+                yield Droplet(self.client, self._raw[row])
+            return
+
+        ids = self._columns['id']
+        async for _, d in fetch_by_ids(
+            self.client, [ids[row] for row in rows],
+            "droplets", "droplet"
+        ):
+            if isinstance(d, BaseException):
+                raise d
+            elif d is not None:
+                yield Droplet(self.client, d)
+    # Turns rows into Droplet objects. Uses the kept JSON if there is any,
+    # otherwise fetches the droplets.
+# A column-packed table of droplets for fast queries over large fleets.
@@ -0,0 +1,225 @@
+"""
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+
+import abc
+import asyncio
+from .abc import Droplet
+from .exceptions import Forbidden, ClientClosed
+from .pagination import fetch_all_pages
+from .query import compile_predicate, droplet_api_filters, DROPLET_FIELDS
+# Imports go here.
+
+
+class DropletEvent(abc.ABC):
+    __slots__ = ["droplet"]
+
+    def __init__(self, droplet):
+        self.droplet = droplet
+
+    def __repr__(self):
+        return f"<{type(self).__name__} droplet={self.droplet.id}>"
+# The base for the events a droplet watch yields.
+
+
+class DropletAdded(DropletEvent):
+    __slots__ = []
+# A droplet was created, or now matches the filters.
+
+
+class DropletRemoved(DropletEvent):
+    __slots__ = []
+# A droplet was deleted, or no longer matches the filters. The droplet is
+# the last version seen.
+
+
+class DropletChanged(DropletEvent):
+    __slots__ = ["previous", "fields"]
+
+    def __init__(self, droplet, previous, fields):
+        super().__init__(droplet)
+        self.previous = previous
+        self.fields = fields
+# A droplet changed. Fields holds the names of the JSON fields which
+# changed, such as "status" or "tags".
+
+
+class _Subscriber:
+    __slots__ = ["interval", "matches", "ids", "queue"]
+
+    def __init__(self, interval, matches):
+        self.interval = interval
+        self.matches = matches
+        self.ids = set()
+        self.queue = asyncio.Queue()
+
+    def seen(self, droplet, previous=None, fields=None):
+        matches = self.matches(droplet)
+        if droplet.id in self.ids:
+            if not matches:
+                self.ids.discard(droplet.id)
+                self.queue.put_nowait(DropletRemoved(droplet))
+            elif fields:
+                self.queue.put_nowait(
+                    DropletChanged(droplet, previous, fields)
+                )
+        elif matches:
+            self.ids.add(droplet.id)
+            self.queue.put_nowait(DropletAdded(droplet))
+    # Works out what a new or changed droplet means to this subscriber.
+
+    def gone(self, droplet):
+        if droplet.id in self.ids:
+            self.ids.discard(droplet.id)
+            self.queue.put_nowait(DropletRemoved(droplet))
+    # Handles a droplet which was deleted.
+# One consumer of a feed, with its own filters and the IDs it has seen.
+
+
+class _Feed:
+    def __init__(self, client, params, max_errors):
+        self.client = client
+        self.params = params
+        self.max_errors = max_errors
+        self.subscribers = set()
+        self.synced = False
+        self._raw = {}
+        self._droplets = {}
+        self._task = None
+
+    def subscribe(self, subscriber):
+        self.subscribers.add(subscriber)
+        # Catch up with what everybody else has already seen.
+        for droplet in self._droplets.values():
+            subscriber.seen(droplet)
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+        if not self.subscribers:
+            self.stop()
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+    # Subscribers share one poll loop, which stops with the last of them.
+
+    def _apply(self, droplets):
+        latest = {d['id']: d for d in droplets}
+        for _id, _json in latest.items():
+            old = self._raw.get(_id)
+            if old is None:
+                droplet = self._droplets[_id] = Droplet(self.client, _json)
+                for s in self.subscribers:
+                    s.seen(droplet)
+            elif old != _json:
+                fields = tuple(
+                    k for k in _json.keys() | old.keys()
+                    if old.get(k) != _json.get(k)
+                )
+                previous = self._droplets[_id]
+                droplet = self._droplets[_id] = Droplet(self.client, _json)
+                for s in self.subscribers:
+                    s.seen(droplet, previous, fields)
+
+        for _id in self._raw.keys() - latest.keys():
+            droplet = self._droplets.pop(_id)
+            for s in self.subscribers:
+                s.gone(droplet)
+
+        self._raw = latest
+        self.synced = True
+    # Diffs a listing against the last one. Unchanged droplets are skipped
+    # with one dict comparison and never rebuilt.
+
+    def _fail(self, error):
+        for s in self.subscribers:
+            s.queue.put_nowait(error)
+        self._task = None
+    # Hands a error that stops the feed to every subscriber.
+
+    async def _run(self):
+        errors = 0
+        while self.subscribers:
+            try:
+                droplets = await fetch_all_pages(
+                    self.client, "droplets", "droplets",
+                    params=self.params
+                )
+            except Forbidden as e:
+                return self._fail(e)
+            except Exception as e:
+                errors += 1
+                if errors >= self.max_errors:
+                    return self._fail(e)
+            else:
+                errors = 0
+                self._apply(droplets)
+
+            await asyncio.sleep(
+                min(s.interval for s in self.subscribers)
+            )
+    # Lists the droplets every interval (the shortest any subscriber asked
+    # for) until the last subscriber leaves.
+# One shared poll loop over a droplet listing.
+
+
+class DropletWatcher:
+    def __init__(self, client, max_errors=5):
+        self.client = client
+        self.max_errors = max_errors
+        self._feeds = {}
+    # Initialises the watcher.
+
+    async def watch(self, interval=30, filters=None):
+        filters = filters or {}
+        params = droplet_api_filters(filters)
+        key = tuple(sorted(params.items()))
+        subscriber = _Subscriber(
+            interval, compile_predicate(filters, DROPLET_FIELDS)
+        )
+
+        feed = self._feeds.get(key)
+        if feed is None:
+            feed = self._feeds[key] = _Feed(
+                self.client, params, self.max_errors
+            )
+        feed.subscribe(subscriber)
+        try:
+            while True:
+                event = await subscriber.queue.get()
+                if isinstance(event, BaseException):
+                    raise event
+                yield event
+        finally:
+            feed.unsubscribe(subscriber)
+            if not feed.subscribers and self._feeds.get(key) is feed:
+                del self._feeds[key]
+    # Yields a event whenever a droplet matching the filters is added,
+    # removed or changed. Watches with the same API filters share one
+    # listing, however many there are.
+
+    def stop(self):
+        for feed in self._feeds.values():
+            feed.stop()
+            feed._fail(ClientClosed(
+                "The client was closed."
+            ))
+        self._feeds.clear()
+    # Stops every poll loop and ends every watch with ClientClosed.
+# Watches the droplets for changes on behalf of any number of consumers.